@@ -0,0 +1,261 @@
+# Micro-benchmarks for engine hot paths
+# Run from the repository root: python debugging/benchmarks.py [benchmark names...]
+import os, sys, time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+# Scripts
+from scripts.animation import load_animations, AnimationState
+from scripts.entities import Entity, Player, Object
+from scripts.physics import PhysicsWorld
+from scripts.hits import HitDetector
+from scripts.simulation import Simulation
+from scripts.snapshot import SnapshotRing
+from scripts.input import Keyboard, Controls
+from scripts.weapons import Weapon
+from scripts.camera import CameraObject, Camera
+from scripts.weapons import Bullet, BulletPool
+from scripts.rotation import rotation_cache
+from scripts.framework import blit_rotate
+
+BASE_IMG_PATH = "data/images/"
+BENCHMARKS = {}
+
+# Registers a benchmark by its function name
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+# Runs a function a number of times and returns the average time in microseconds, best of a few repeats
+def timed(func, iterations, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = (time.perf_counter() - start) / iterations * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# Entity.render with pre-baked flipped frames against flipping every frame
+@benchmark
+def entity_render(assets, iterations=20000):
+    entity = Entity([0, 0], [8, 13], "player", assets)
+    frames = {id(img) for img in entity.animation.data.images + entity.animation.data.flipped}
+
+    def old_render():
+        return pygame.transform.flip(entity.animation.img(), entity.flip, False)
+
+    def new_render():
+        return entity.render().entity
+
+    for name, render in (("transform.flip", old_render), ("pre-baked", new_render)):
+        allocations = 0
+        for i in range(iterations):
+            entity.flip = i % 2 == 0
+            if id(render()) not in frames:
+                allocations += 1
+        print(f"  {name:<16} {timed(render, iterations):7.2f} us/render  {allocations / iterations:.2f} surfaces allocated/render")
+
+# Rendering a volley of bullets with and without the rotation cache
+@benchmark
+def bullet_render(assets, bullets=500, iterations=50):
+    volley = [Bullet([0, 0], [0, 0], (5, 5), "bullet1", assets, i * 7.3, 5, 30) for i in range(bullets)]
+
+    def uncached():
+        for bullet in volley:
+            img = pygame.transform.rotate(bullet.current_image, bullet.rotation)
+            CameraObject(img, (bullet.pos[0] + bullet.anim_offset[0], bullet.pos[1] + bullet.anim_offset[1]), 1)
+
+    def cached():
+        for bullet in volley:
+            bullet.render()
+
+    rotation_cache.clear()
+    rotation_cache.reset_stats()
+    print(f"  {'transform.rotate':<16} {timed(uncached, iterations):9.1f} us/frame")
+    print(f"  {'rotation cache':<16} {timed(cached, iterations):9.1f} us/frame  {rotation_cache.stats()}")
+
+# Aiming a weapon through blit_rotate with and without the rotation cache
+@benchmark
+def weapon_aim(assets, iterations=20000):
+    gun = assets["gun/idle"].images[0]
+    angles = [(i * 0.37) % 360 for i in range(iterations)]
+
+    for scale in (1, 4):
+        image = pygame.transform.scale_by(gun, scale)
+        rotation_cache.clear()
+        rotation_cache.reset_stats()
+        for name, cache in (("transform.rotate", None), ("rotation cache", rotation_cache)):
+            start = time.perf_counter()
+            for angle in angles:
+                blit_rotate(image, (100, 100), (4, -3), angle, cache)
+            print(f"  {name:<16} {(time.perf_counter() - start) / iterations * 1e6:7.2f} us/rotation  ({image.get_width()}x{image.get_height()})")
+        print(f"  {rotation_cache.stats()}")
+
+# Blit throughput of atlas subsurfaces against standalone frame surfaces
+@benchmark
+def atlas_blit(assets, sprites=5000, iterations=20):
+    atlasAssets = load_animations(BASE_IMG_PATH, atlas=True)
+    target = pygame.Surface((640, 360)).convert()
+
+    for name, animations in (("standalone", assets), ("atlas", atlasAssets)):
+        frames = [img for animation in animations.values() for img in animation.images + animation.flipped]
+        batch = [(frames[i % len(frames)], ((i * 37) % 620, (i * 53) % 340)) for i in range(sprites)]
+        surfaces = {id(img.get_parent() or img) for img in frames}
+        print(f"  {name:<16} {timed(lambda: target.blits(batch, False), iterations) / sprites * 1000:7.1f} ns/blit  {len(surfaces)} source surfaces")
+
+    # Blitting straight from the atlas pages with an area rect skips the subsurface indirection
+    batch = [(img.get_parent(), pos, pygame.Rect(img.get_offset(), img.get_size())) for img, pos in batch]
+    print(f"  {'atlas area':<16} {timed(lambda: target.blits(batch, False), iterations) / sprites * 1000:7.1f} ns/blit")
+
+# Advancing and switching the animations of many entities
+@benchmark
+def animation_states(assets, entities=2000, iterations=200):
+    crowd = [Entity([0, 0], [8, 13], "player", assets) for _ in range(entities)]
+    actions = ("idle", "run", "jump")
+    states = [entity.animation for entity in crowd]
+
+    def per_entity():
+        for entity in crowd:
+            entity.update_animation(1)
+
+    def switch_actions():
+        for i, entity in enumerate(crowd):
+            entity.set_action(actions[i % 3])
+        for entity in crowd:
+            entity.set_action("idle")
+
+    print(f"  {'per entity':<16} {timed(per_entity, iterations) / entities * 1000:7.1f} ns/entity")
+    print(f"  {'update_all':<16} {timed(lambda: AnimationState.update_all(states, 1), iterations) / len(states) * 1000:7.1f} ns/state")
+    print(f"  {'set_action':<16} {timed(switch_actions, iterations) / entities / 2 * 1000:7.1f} ns/change  {sys.getsizeof(crowd[0].animation)} bytes/state")
+
+# Camera.render with the layer-bucketed queue against the path it replaced: cull, sort, then blit one object at a time
+# Both cull, so the difference is the queue alone, which measures within noise of the old path since SDL's blits dominate
+@benchmark
+def camera_render(assets, sprites=5000, iterations=20):
+    camera = Camera((1280, 720), 2, 0)
+    frames = [img for animation in assets.values() for img in animation.images]
+
+    def old_render():
+        visible = camera.cullCameraObjects(cameraObjects)
+        for camObj in camera.sortCameraObjects(visible):
+            match type(camObj.entity):
+                case pygame.Rect:
+                    tempRect = pygame.Rect(camObj.entity.x - camera.scroll[0], camObj.entity.y - camera.scroll[1], camObj.entity.width, camObj.entity.height)
+                    pygame.draw.rect(camera.screen, camObj.colour, tempRect)
+                case pygame.Surface:
+                    camera.screen.blit(camObj.entity, ((camObj.pos[0] - camera.trueScroll[0]), (camObj.pos[1] - camera.trueScroll[1])))
+        pygame.transform.scale(camera.screen, camera.display.get_size(), camera.display)
+
+    # Everything on screen, then a level four times the size of the view
+    for worldSize in ((620, 340), (2480, 1360)):
+        cameraObjects = [CameraObject(frames[i % len(frames)], [(i * 37) % worldSize[0], (i * 53) % worldSize[1]], i % 3) for i in range(sprites)]
+        print(f"  world {worldSize[0]}x{worldSize[1]}")
+        print(f"    {'cull, sort, blit':<16} {timed(old_render, iterations) / 1000:7.2f} ms/frame")
+        print(f"    {'render queue':<16} {timed(lambda: camera.render(*cameraObjects), iterations) / 1000:7.2f} ms/frame  {camera.renderStats}")
+
+# Player momentum updated one object at a time against one vectorised PhysicsWorld step
+@benchmark
+def physics_step(assets, bodies=1000, iterations=50):
+    world = PhysicsWorld()
+    loose = [Player(i, [i, 0], [8, 13], "player", assets) for i in range(bodies)]
+    stepped = [Player(i, [i, 0], [8, 13], "player", assets, world) for i in range(bodies)]
+    for i, player in enumerate(loose + stepped):
+        player.directions["right"] = i % 3 == 0
+        player.directions["left"] = i % 3 == 1
+
+    def per_object():
+        for player in loose:
+            player.update_momentum()
+
+    print(f"  {'per object':<16} {timed(per_object, iterations) / bodies * 1000:7.1f} ns/body")
+    print(f"  {'world step':<16} {timed(world.step, iterations) / bodies * 1000:7.1f} ns/body  ({len(world)} bodies)")
+
+# Firing and expiring bullets through the pool against constructing a new Bullet per shot
+@benchmark
+def bullet_pool(assets, bullets=200, iterations=50):
+    pool = BulletPool(assets)
+    live = []
+
+    def construct():
+        for i in range(bullets):
+            live.append(Bullet([0, 0], (0, 0), (5, 5), "bullet1", assets, i % 360, 5, 30))
+        live.clear()
+
+    def pooled():
+        for i in range(bullets):
+            live.append(pool.acquire((0, 0), (0, 0), i % 360, 5, 30))
+        for bullet in live:
+            pool.release(bullet)
+        live.clear()
+
+    print(f"  {'construct':<16} {timed(construct, iterations) / bullets * 1000:7.1f} ns/shot")
+    pooled()
+    allocated = pool.allocated
+    print(f"  {'pool':<16} {timed(pooled, iterations) / bullets * 1000:7.1f} ns/shot  {pool.allocated - allocated} allocations after warm-up  {pool.stats()}")
+
+# Bullets against players with a closure per pair against the broadphase hit detector
+@benchmark
+def hit_detection(assets, players=16, bullets=4000, iterations=20):
+    pool = BulletPool(assets)
+    crowd = [Player(i, [i * 40, 100], [8, 13], "player", assets) for i in range(players)]
+    for i, player in enumerate(crowd):
+        player.rect.topleft = (i * 40, 100)
+        player.weapon = Object([0, 0], [8, 8])
+        player.weapon.bullets = [pool.acquire(((j * 37) % (players * 40), 60 + (j * 53) % 120), (0, 0), 0, 5, 30) for j in range(bullets // players)]
+    detector = HitDetector(precise=False)
+    precise = HitDetector()
+
+    def pair_closures():
+        for attacker in crowd:
+            for bullet in attacker.weapon.bullets:
+                for player in crowd:
+                    if player.id != attacker.id:
+                        bullet.check_collision_on_entity(player, lambda entity=player, damageEntity=bullet: None)
+
+    print(f"  {'pair closures':<16} {timed(pair_closures, iterations) / 1000:7.2f} ms/pass")
+    print(f"  {'hit detector':<16} {timed(lambda: detector.detect(crowd), iterations) / 1000:7.2f} ms/pass  {detector.stats}")
+    print(f"  {'cached masks':<16} {timed(lambda: precise.detect(crowd), iterations) / 1000:7.2f} ms/pass  {precise.stats}")
+
+    # Building the masks every time instead of caching them per frame
+    image = crowd[0].current_image
+    print(f"  {'from_surface':<16} {timed(lambda: pygame.mask.from_surface(image), 1000):7.1f} us/mask")
+
+# Saving and restoring the whole simulation, and rewinding to resimulate a few steps as rollback would
+@benchmark
+def snapshot_ring(assets, players=8, shots=60, rollback=8, iterations=200):
+    simulation = Simulation(assets, Camera((1280, 720), 2, headless=True))
+    controls = Controls(pygame.K_d, pygame.K_a, pygame.K_LSHIFT, pygame.K_SPACE, pygame.K_ESCAPE, 1)
+    for i in range(players):
+        player = simulation.create_player([i * 40, 0], Weapon([0, 0], [8, 8], "gun", assets, (4, -3), 90, simulation.projectiles), Keyboard(controls))
+        player.directions["right"] = i % 2 == 0
+    for _ in range(shots):
+        for player in simulation.players:
+            player.weapon.shoot(player.cursor)
+        simulation.update(2)
+    ring = SnapshotRing(simulation, rollback)
+    ring.save()
+    tick = simulation.tick
+    bullets = sum(len(player.weapon.bullets) for player in simulation.players)
+
+    def resimulate():
+        ring.restore(tick)
+        for _ in range(rollback):
+            simulation.update(2)
+
+    print(f"  {players} players, {bullets} bullets, {ring.sizes[tick % rollback]} bytes/snapshot")
+    print(f"  {'save':<16} {timed(ring.save, iterations):7.1f} us")
+    print(f"  {'restore':<16} {timed(lambda: ring.restore(tick), iterations):7.1f} us")
+    print(f"  {'rollback':<16} {timed(resimulate, iterations // 10) / 1000:7.2f} ms for {rollback} steps")
+
+if __name__ == "__main__":
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    assets = load_animations(BASE_IMG_PATH)
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(name)
+        BENCHMARKS[name](assets)
@@ -1,27 +1,43 @@
 # Modules
 import pygame
 import sys
+import os
 import time
+import argparse
 from pygame.constants import *
 
 # Scripts
-from scripts.framework import blit_center
+from scripts.framework import blit_center, init_headless
 from scripts.animation import load_images, load_animations
 from scripts.input import Controller, Keyboard, Controls, controller_check
 from scripts.entities import Player
 from scripts.camera import Camera, CameraObject
 from scripts.settings import Settings
 from scripts.weapons import Weapon
+from scripts.simulation import Simulation
+from scripts.staticlayer import StaticLayer
+from scripts.bundle import load_bundle, bundle_is_current
+from scripts.hotreload import AssetWatcher
+from scripts.timestep import FixedTimestep, TICK_RATE
+from scripts.replay import ReplayRecorder, load_replay, state_digest
 
 BASE_IMG_PATH = "data/images/"
+BUNDLE_PATH = "data/assets.bundle" # baked with: python -m scripts.bundle
 
 MENU = 0
 PLAYING = 1
 PAUSED = 2
 
+# headless: renders into an offscreen surface, render: set to False to only run the simulation
+# rate: simulation steps per second, defaults to the settings
+# record: file the input of every step is saved to, replay: file whose input replaces the devices
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, render=True, devMode=False, rate=None, record=None, replay=None):
         # Initialisation
+        self.headless = headless
+        self.shouldRender = render
+        if headless:
+            init_headless()
         pygame.init()
         pygame.font.init()
         pygame.mixer.init()
@@ -29,11 +45,18 @@ class Game:
 
          # Main Settings
         self.clock: pygame.time.Clock = pygame.time.Clock()
-        self.settings: Settings = Settings.load_from_file("data/settings.dat")
+        self.settings: Settings = Settings.load_from_file("data/settings.dat", headless)
+
+        # Replays run with the resolution and step they were recorded with, the camera depends on both
+        self.recordPath = record
+        self.replay = load_replay(replay) if replay is not None else None
+        if self.replay is not None:
+            self.settings.resolution = self.replay.resolution
+            rate = TICK_RATE / self.replay.dt
 
         # Camera
         self.cameraObjects = []
-        self.camera = Camera(self.settings.resolution, 2)
+        self.camera = Camera(self.settings.resolution, 2, headless=headless)
 
         # Joystick        
         self.inputDevices: list[Controller | Keyboard] = []
@@ -41,31 +64,59 @@ class Game:
         # States
         self.currentState = PLAYING
 
-        # Assets
-        self.assets = load_animations(BASE_IMG_PATH)
-
-        # Entities
-        self.players = []
-        self.floor = pygame.Rect(0, 100, 3000, 20)
-
-        # Delta Time Calculations
-        self.prev_time = time.time()
-        self.dt = 0
+        # Assets, decoded serially as worker threads are slower on a set this small
+        # The bundle is skipped once the images change after baking, and in development mode where the images are edited live
+        if not devMode and bundle_is_current(BUNDLE_PATH, BASE_IMG_PATH):
+            self.assets = load_bundle(BUNDLE_PATH)
+        else:
+            if os.path.exists(BUNDLE_PATH) and not devMode:
+                print(f"{BUNDLE_PATH} is older than the images, loading them instead (re-bake with: python -m scripts.bundle)")
+            self.assets = load_animations(BASE_IMG_PATH, lazy=True)
+
+        # Development mode reloads changed sprites while the game is running and reports asset load timings
+        self.devMode = devMode
+        self.assetWatcher = AssetWatcher(self.assets, BASE_IMG_PATH) if devMode else None
+
+        # Simulation
+        self.simulation = Simulation(self.assets, self.camera)
+        self.staticLayers = [StaticLayer()]
+        self.staticLayers[0].add_rect(self.simulation.floor, (0, 255, 0))
+
+        # Fixed Timestep, settings saved by older versions don't have the timestep fields
+        self.timestep = FixedTimestep(rate or getattr(self.settings, "simulationRate", 60), getattr(self.settings, "maxCatchUpSteps", 5))
+        self.prev_time = time.perf_counter()
+        self.dt = self.timestep.dt
         
     def start(self):
         self.detect_inputs()
-        self.create_player([0, 0], Weapon([0, 0], [8, 8], "gun", self.assets, (4, -3), 90), 0)
-        self.create_player([0, 0], Weapon([0, 0], [8, 8], "gun", self.assets, (4, -3), 90), 1)
+        self.create_player([0, 0], Weapon([0, 0], [8, 8], "gun", self.assets, (4, -3), 90, self.simulation.projectiles), 0)
+        self.create_player([0, 0], Weapon([0, 0], [8, 8], "gun", self.assets, (4, -3), 90, self.simulation.projectiles), 1)
         self.camera.set_targets(self.players, (0, -50))
         self.camera.toggle_panning()
-
+        if self.recordPath is not None:
+            self.simulation.recorder = ReplayRecorder(self.timestep.dt, self.settings.resolution)
+        if self.replay is not None:
+            self.simulation.replay = self.replay
+        if self.devMode:
+            self.assets.report_timings()
+
+    @property
+    def players(self):
+        return self.simulation.players
+
+    # Loads a .csv map and uses its merged rects for collisions
+    def load_level(self, filename, tileSize=16):
+        self.simulation.load_level(filename, tileSize)
+        self.staticLayers.insert(0, StaticLayer.from_tilemap(self.simulation.tilemap))
+
+    # Falls back to the last input device when there are fewer devices than players
     def create_player(self, pos, weapon, input=0):
-        player = Player(len(self.players), pos, [8, 13], "player", self.assets)
-        player.weapon = weapon
-        player.input = self.inputDevices[input]
-        self.players.append(player)
+        self.simulation.create_player(pos, weapon, self.inputDevices[min(input, len(self.inputDevices) - 1)])
 
     def detect_inputs(self):
+        if self.replay is not None:
+            self.inputDevices = self.replay.create_devices(self.settings)
+            return
         self.inputDevices = []
         self.inputDevices.append(Keyboard(self.settings.keyboard))
 
@@ -88,6 +139,7 @@ class Game:
     def playing_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                self.save_recording()
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.KEYDOWN:
@@ -97,26 +149,37 @@ class Game:
                     else:
                         self.currentState = PAUSED
             
-            for player in self.players:
-                player.input_events(event)
+            # Devices collect the events, players handle them on the next simulation step
+            for device in self.inputDevices:
+                device.handle_event(event)
+
+    # Saves the recorded input along with a digest of the current state
+    def save_recording(self):
+        recorder = self.simulation.recorder
+        if recorder is not None:
+            recorder.save(self.recordPath, state_digest(self.simulation))
+            print(f"Recorded {recorder.ticks} steps to {self.recordPath}")
 
     def update(self):
-        player: Player
-        for player in self.players:
-            player.update([self.floor], self.dt, self.camera)
-            player.update_animation(self.dt)
-            player.check_entity_collisions(self.players)
-        self.camera.update(self.dt)
+        if self.assetWatcher is not None:
+            self.assetWatcher.poll()
+
+        self.simulation.update(self.dt)
 
-    def render(self):
+    # alpha is how far the frame is between the last two simulation steps
+    def render(self, alpha=1.0):
+        if not self.shouldRender:
+            return
+        self.camera.interpolate_scroll(alpha)
         self.cameraObjects = []
         self.camera.screen.fill((100, 100, 150))
-        self.add_camera_object(self.floor, (0, 255, 0), True)
+        for staticLayer in self.staticLayers:
+            for camObj in staticLayer.camera_objects(self.camera):
+                self.add_camera_object(camObj)
         
         player: Player
         for player in self.players:
-            tempPlayer = player.render()[0]
-            tempWeaponAndBullets = player.render()[1]
+            tempPlayer, tempWeaponAndBullets = player.render(alpha)
             self.add_camera_object(tempPlayer)
 
 
@@ -124,26 +187,62 @@ class Game:
                 self.add_camera_object(camObj)
     
         self.camera.render(*self.cameraObjects)
+        self.camera.restore_scroll()
 
         for player in self.players:
             self.camera.display.blit(player.cursor.current_image, player.cursor.pos)
 
-        pygame.display.update()
+        if not self.headless:
+            pygame.display.update()
 
-    def run(self):
+    # Runs the game loop, optionally for a number of frames, replays stop once all of their steps are simulated
+    # The simulation advances in fixed steps and frames are rendered between the last two of them
+    # Headless runs don't wait for the clock and simulate exactly one step per frame for reproducible results
+    def run(self, frames=None):
         self.start()
-        while True:
-            self.clock.tick(self.settings.targetFPS)
-            now = time.time()
-            self.dt = (now - self.prev_time) * self.settings.targetFPS
-            self.prev_time = now
-            
+        frame = 0
+        self.prev_time = time.perf_counter()
+        while (frames is None or frame < frames) and not (self.replay is not None and self.replay.finished):
+            frame += 1
+            if self.headless:
+                steps = 1
+                alpha = 1.0
+            else:
+                self.clock.tick(self.settings.targetFPS)
+                now = time.perf_counter()
+                steps = self.timestep.advance(now - self.prev_time)
+                alpha = self.timestep.alpha
+                self.prev_time = now
+
             if self.currentState == MENU:
-                pass
+                self.timestep.reset()
             elif self.currentState == PLAYING:
                 pygame.mouse.set_visible(False)
-                self.update()
-                self.render()
+                for _ in range(steps):
+                    self.update()
+                self.render(alpha)
                 self.playing_events()
-
-Game().run()
+            else:
+                self.timestep.reset()
+        self.save_recording()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dev", action="store_true", help="reload changed sprites while running and report asset load timings")
+    parser.add_argument("--headless", action="store_true", help="render offscreen without opening a window")
+    parser.add_argument("--no-render", action="store_true", help="only run the simulation")
+    parser.add_argument("--frames", type=int, default=None, help="stop after a number of frames")
+    parser.add_argument("--rate", type=float, default=None, help="simulation steps per second")
+    parser.add_argument("--record", default=None, help="save the input of every step to a replay file")
+    parser.add_argument("--replay", default=None, help="play back a replay file, fastest with --headless --no-render")
+    args = parser.parse_args()
+
+    game = Game(args.headless, not args.no_render, args.dev, args.rate, args.record, args.replay)
+    start = time.perf_counter()
+    game.run(args.frames)
+    elapsed = time.perf_counter() - start
+    if args.frames or game.replay is not None:
+        ticks = game.simulation.tick
+        print(f"{ticks} steps in {elapsed:.2f} s ({ticks / elapsed:.0f} steps/s)")
+    if game.replay is not None:
+        print("Replay matches the recorded state" if game.replay.matches(game.simulation) else "Replay desynced from the recorded state")
@@ -1,63 +1,246 @@
 import pygame
 import json
 import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 
-# Animation System
+# Scripts
+from scripts.atlas import TextureAtlas
+
+# Animation System, shared frame data which is never copied per entity
 class Animation:
-    def __init__(self, images, img_dur=0.2, loop=True):
+    def __init__(self, images, img_dur=0.2, loop=True, flipped=None):
         self.images = images
+        # Mirrored frames are baked once and shared by every entity
+        self.flipped = flipped if flipped is not None else [pygame.transform.flip(img, True, False) for img in images]
         self.loop = loop
         self.img_duration = img_dur
+        # Hit masks are built the first time a frame is tested and shared like the frames
+        self.masks: list[pygame.mask.Mask] = [None] * len(images)
+        self.flippedMasks: list[pygame.mask.Mask] = [None] * len(images)
+
+    # Replaces the frames, cached masks are dropped
+    def set_frames(self, images, flipped=None):
+        self.images = images
+        self.flipped = flipped if flipped is not None else [pygame.transform.flip(img, True, False) for img in images]
+        self.masks = [None] * len(images)
+        self.flippedMasks = [None] * len(images)
+
+    # Returns the hit mask of a frame from its colorkey, built on first use
+    def mask(self, frame, flip=False):
+        masks = self.flippedMasks if flip else self.masks
+        mask = masks[frame]
+        if mask is None:
+            mask = pygame.mask.from_surface(self.flipped[frame] if flip else self.images[frame])
+            masks[frame] = mask
+        return mask
+
+    # Returns a new playback state for this animation
+    def state(self):
+        return AnimationState(self)
+
+# Playback state of an entity's animation, only holds the frame, elapsed time and done flag
+class AnimationState:
+    __slots__ = ("data", "frame", "time_elapsed", "done", "__weakref__")
+    live = weakref.WeakSet() # every state still referenced by an entity
+
+    def __init__(self, data:Animation):
+        self.data = data
+        self.frame = 0
+        self.time_elapsed = 0
         self.done = False
+        AnimationState.live.add(self)
+
+    # Switches to another animation without allocating
+    def set(self, data:Animation):
+        self.data = data
         self.frame = 0
         self.time_elapsed = 0
-    
-    # Returns a copy of itself
-    def copy(self):
-        return Animation(self.images, self.img_duration, self.loop)
-    
+        self.done = False
+
     # Updates the current frame (uses deltatime)
     def update(self, dt):
-        self.time_elapsed += dt
-        while self.time_elapsed >= self.img_duration:
-            self.time_elapsed -= self.img_duration
-            if self.loop:
-                self.frame = (self.frame + 1) % len(self.images)
+        data = self.data
+        elapsed = self.time_elapsed + dt
+        duration = data.img_duration
+        if elapsed < duration:
+            self.time_elapsed = elapsed
+            return
+        count = len(data.images)
+        frame = self.frame
+        while elapsed >= duration:
+            elapsed -= duration
+            if data.loop:
+                frame = (frame + 1) % count
             else:
-                self.frame = min(self.frame + 1, len(self.images) - 1)
-                if self.frame == len(self.images) - 1:
+                frame = min(frame + 1, count - 1)
+                if frame == count - 1:
                     self.done = True
-    
-    # Returns the current frame
-    def img(self):
-        return self.images[self.frame]
-    
-# Loads an image using its location   
-def load_image(path):
-    img = pygame.image.load(path).convert()
+        self.frame = frame
+        self.time_elapsed = elapsed
+
+    # Returns the current frame, mirrored on the x axis if flip is set
+    def img(self, flip=False):
+        if flip:
+            return self.data.flipped[self.frame]
+        return self.data.images[self.frame]
+
+    # Returns the hit mask of the current frame
+    def mask(self, flip=False):
+        return self.data.mask(self.frame, flip)
+
+    # Advances a collection of states in one pass
+    @staticmethod
+    def update_all(states, dt):
+        for state in states:
+            state.update(dt)
+
+# Decodes an image file, safe to call from worker threads
+def decode_image(path):
+    return pygame.image.load(path)
+
+# Converts a decoded image to the display format and sets its colorkey
+def prepare_image(img):
+    if pygame.display.get_surface() is not None:
+        img = img.convert()
     img.set_colorkey((0, 0, 0))
     return img
+
+# Loads an image using its location   
+def load_image(path):
+    return prepare_image(decode_image(path))
     
+# Returns the sorted image paths in a location
+def image_paths(path):
+    return [path + '/' + img_name for img_name in sorted(os.listdir(path))]
+
 # Loads a group of images in a alocation
 def load_images(path):
     images = []
-    for img_name in sorted(os.listdir(path)):
-        images.append(load_image(path + '/' + img_name))
+    for img_path in image_paths(path):
+        images.append(load_image(img_path))
     return images
 
-    
-def load_animations(base_path, data="data/animation_data.json"):
-    assets = {}
+# Moves the frames of a group of animations into a texture atlas
+def pack_animations(animations, atlas):
+    frames = []
+    for animation in animations:
+        frames.extend(animation.images)
+        frames.extend(animation.flipped)
+    packed = atlas.pack(frames)
+    index = 0
+    for animation in animations:
+        count = len(animation.images)
+        animation.set_frames(packed[index:index + count], packed[index + count:index + count * 2])
+        index += count * 2
+    return atlas
+
+# Asset dictionary which loads deferred animations the first time they are looked up
+class AnimationAssets(dict):
+    def __init__(self):
+        super().__init__()
+        self.pending: dict[str, tuple] = {} # name -> (group, path, img_dur, loop)
+        self.timings: dict[str, float] = {"scan": 0, "decode": 0, "convert": 0, "build": 0, "atlas": 0}
+        self.workers: int = 0
+        self.atlas: bool = False
+        self.atlasSize: tuple[int, int] = (2048, 2048)
+
+    def __missing__(self, name):
+        if name not in self.pending:
+            raise KeyError(name)
+        # Atlases are packed per group, so a deferred group is loaded all at once
+        if self.atlas:
+            group = self.pending[name][0]
+            self.load([pendingName for pendingName, entry in self.pending.items() if entry[0] == group])
+        else:
+            self.load([name])
+        return dict.__getitem__(self, name)
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self.pending
+
+    # Loads pending animations, decoding their images across the worker threads
+    def load(self, names):
+        entries = [(name, self.pending.pop(name)) for name in names if name in self.pending]
+        if not entries:
+            return
+
+        start = time.perf_counter()
+        paths = [image_paths(entry[1]) for _, entry in entries]
+        files = [path for animationPaths in paths for path in animationPaths]
+        self.timings["scan"] += time.perf_counter() - start
+
+        # pygame releases the GIL while decoding, conversion needs the main thread
+        start = time.perf_counter()
+        if self.workers > 1 and len(files) > 1:
+            with ThreadPoolExecutor(self.workers) as pool:
+                decoded = list(pool.map(decode_image, files))
+        else:
+            decoded = [decode_image(path) for path in files]
+        self.timings["decode"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        images = [prepare_image(img) for img in decoded]
+        self.timings["convert"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        groups = {}
+        index = 0
+        for (name, (group, path, img_dur, loop)), animationPaths in zip(entries, paths):
+            self[name] = Animation(images[index:index + len(animationPaths)], img_dur, loop)
+            groups.setdefault(group, []).append(self[name])
+            index += len(animationPaths)
+        self.timings["build"] += time.perf_counter() - start
+
+        if self.atlas:
+            start = time.perf_counter()
+            for animations in groups.values():
+                pack_animations(animations, TextureAtlas(self.atlasSize))
+            self.timings["atlas"] += time.perf_counter() - start
+
+    # Loads everything that is still pending
+    def load_all(self):
+        self.load(list(self.pending))
+
+    # Prints how long each loading phase took
+    def report_timings(self):
+        total = sum(self.timings.values())
+        for phase, seconds in self.timings.items():
+            print(f"{phase:>8}: {seconds * 1000:8.2f} ms")
+        print(f"{'total':>8}: {total * 1000:8.2f} ms ({len(self)} loaded, {len(self.pending)} deferred)")
+
+# Finds every animation folder and its settings, returns name -> (group, path, img_dur, loop)
+def scan_animations(base_path, data="data/animation_data.json"):
     with open(data, "rb") as file:
         data = json.load(file)
 
+    animations = {}
     for group in os.listdir(base_path):
         for folder in os.listdir(base_path+group):
             for animation in os.listdir(base_path+group+"/"+folder):
                 name = f"{folder}/{animation}"
+                path = f"{base_path}{group}/{folder}/{animation}"
                 if name in data:
-                    assets[name] = Animation(load_images(f"{base_path}{group}/{folder}/{animation}"), data[name]["img_dur"], data[name]["loop"])
+                    animations[name] = (group, path, data[name]["img_dur"], data[name]["loop"])
                 else:
-                    assets[name] = Animation(load_images(f"{base_path}{group}/{folder}/{animation}"))
+                    animations[name] = (group, path, 0.2, True)
+    return animations
+
+# Loads every animation
+# atlas: the frames of each group (entities, weapons...) share one or a few surfaces
+# workers: number of threads decoding images
+# lazy: animations are only loaded when first looked up, e.g. by Entity.set_action
+def load_animations(base_path, data="data/animation_data.json", atlas=False, atlasSize=(2048, 2048), workers=0, lazy=False):
+    assets = AnimationAssets()
+    assets.atlas = atlas
+    assets.atlasSize = atlasSize
+    assets.workers = workers
+
+    start = time.perf_counter()
+    assets.pending.update(scan_animations(base_path, data))
+    assets.timings["scan"] += time.perf_counter() - start
 
-    return assets
\ No newline at end of file
+    if not lazy:
+        assets.load_all()
+    return assets
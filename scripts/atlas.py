@@ -0,0 +1,64 @@
+# Modules
+import pygame
+
+# Packs many small surfaces into a few large ones, frames become subsurfaces of the atlas
+class TextureAtlas:
+    def __init__(self, maxSize=(2048, 2048), padding=1, colorkey=(0, 0, 0)):
+        self.maxSize: tuple[int, int] = maxSize
+        self.padding: int = padding
+        self.colorkey = colorkey
+        self.surfaces: list[pygame.Surface] = []
+
+    # Returns the number of bytes used by the atlas surfaces
+    @property
+    def memory(self):
+        return sum(surf.get_width() * surf.get_height() * surf.get_bytesize() for surf in self.surfaces)
+
+    # Packs the images into new atlas surfaces and returns their subsurfaces in the same order
+    def pack(self, images):
+        placements = self.place(images)
+        if not placements:
+            return []
+
+        pages = {}
+        for page, x, y in placements:
+            pages.setdefault(page, [0, 0])
+        for image, (page, x, y) in zip(images, placements):
+            pages[page][0] = max(pages[page][0], x + image.get_width())
+            pages[page][1] = max(pages[page][1], y + image.get_height())
+
+        start = len(self.surfaces)
+        for page in sorted(pages):
+            surf = pygame.Surface(pages[page])
+            if pygame.display.get_surface() is not None:
+                surf = surf.convert()
+            if self.colorkey is not None:
+                surf.fill(self.colorkey)
+                surf.set_colorkey(self.colorkey)
+            self.surfaces.append(surf)
+
+        frames = []
+        for image, (page, x, y) in zip(images, placements):
+            surf = self.surfaces[start + page]
+            surf.blit(image, (x, y))
+            frames.append(surf.subsurface((x, y, image.get_width(), image.get_height())))
+        return frames
+
+    # Shelf packing, tallest images first, returns (page, x, y) for each image
+    def place(self, images):
+        placements = [None] * len(images)
+        order = sorted(range(len(images)), key=lambda i: (images[i].get_height(), images[i].get_width()), reverse=True)
+        page, x, y, shelfHeight = 0, 0, 0, 0
+        for i in order:
+            width, height = images[i].get_size()
+            if width > self.maxSize[0] or height > self.maxSize[1]:
+                raise ValueError(f"Image of size {width}x{height} does not fit in a {self.maxSize[0]}x{self.maxSize[1]} atlas")
+            # Start a new shelf, then a new page when out of room
+            if x + width > self.maxSize[0]:
+                x, y, shelfHeight = 0, y + shelfHeight + self.padding, 0
+            if y + height > self.maxSize[1]:
+                page, x, y, shelfHeight = page + 1, 0, 0, 0
+            placements[i] = (page, x, y)
+            x += width + self.padding
+            shelfHeight = max(shelfHeight, height)
+        return placements
@@ -0,0 +1,168 @@
+# Modules
+import pygame, os, mmap, struct, time, argparse, hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Scripts
+from scripts.animation import Animation, AnimationAssets, scan_animations, image_paths, pack_animations
+from scripts.atlas import TextureAtlas
+
+BUNDLE_MAGIC = b"SHBN"
+BUNDLE_VERSION = 2
+# Little-endian 32 bit pixels, the same byte order as the usual XRGB8888 display format
+PIXEL_FORMAT = "BGRA"
+# magic, version, pixel format, animation count, index size, digest of the source files' paths, sizes and mtimes
+BUNDLE_HEADER = struct.Struct("<4sH4sII20s")
+# img_dur, loop, frame count
+ANIMATION_ENTRY = struct.Struct("<dBH")
+# width, height, offset from the start of the pixel data
+FRAME_ENTRY = struct.Struct("<HHQ")
+ALIGNMENT = 16
+
+# Decodes an image into raw pixels, runs in the baker's worker processes
+def decode_pixels(path):
+    img = pygame.image.load(path)
+    return img.get_width(), img.get_height(), pygame.image.tobytes(img, PIXEL_FORMAT)
+
+# Packs a string with its length
+def pack_string(text):
+    encoded = text.encode()
+    return struct.pack("<H", len(encoded)) + encoded
+
+# Reads a string packed with pack_string, returns it and the next offset
+def unpack_string(buffer, offset):
+    length = struct.unpack_from("<H", buffer, offset)[0]
+    offset += 2
+    return bytes(buffer[offset:offset + length]).decode(), offset + length
+
+# Hashes the path, size and modification time of every image and the animation data, any edit changes the digest
+def source_digest(base_path="data/images/", data="data/animation_data.json"):
+    animations = scan_animations(base_path, data)
+    digest = hashlib.sha1()
+    for path in [data] + [path for name in sorted(animations) for path in image_paths(animations[name][1])]:
+        stat = os.stat(path)
+        digest.update(struct.pack("<QQ", stat.st_size, stat.st_mtime_ns))
+        digest.update(path.encode())
+    return digest.digest()
+
+# Checks that a bundle exists and was baked from the current source files
+# Without the source images there is nothing to compare against, so the bundle is trusted
+def bundle_is_current(path="data/assets.bundle", base_path="data/images/", data="data/animation_data.json"):
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as file:
+        header = file.read(BUNDLE_HEADER.size)
+    if len(header) < BUNDLE_HEADER.size:
+        return False
+    magic, version, _, _, _, digest = BUNDLE_HEADER.unpack(header)
+    if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+        return False
+    if not os.path.isdir(base_path):
+        return True
+    return digest == source_digest(base_path, data)
+
+# Bakes the image tree and animation data into a single bundle file
+def bake(base_path="data/images/", data="data/animation_data.json", out="data/assets.bundle", processes=0):
+    start = time.perf_counter()
+    animations = scan_animations(base_path, data)
+    names = sorted(animations)
+    paths = {name: image_paths(animations[name][1]) for name in names}
+    files = [path for name in names for path in paths[name]]
+
+    if processes > 1 and len(files) > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            decoded = list(pool.map(decode_pixels, files, chunksize=max(1, len(files) // (processes * 4))))
+    else:
+        decoded = [decode_pixels(path) for path in files]
+
+    index = bytearray()
+    chunks = []
+    offset = 0
+    frame = 0
+    for name in names:
+        group, path, img_dur, loop = animations[name]
+        index += pack_string(name) + pack_string(group)
+        index += ANIMATION_ENTRY.pack(img_dur, loop, len(paths[name]))
+        for _ in paths[name]:
+            width, height, pixels = decoded[frame]
+            frame += 1
+            index += FRAME_ENTRY.pack(width, height, offset)
+            padding = -len(pixels) % ALIGNMENT
+            chunks.append(pixels + bytes(padding))
+            offset += len(pixels) + padding
+
+    header = BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, PIXEL_FORMAT.encode(), len(names), len(index), source_digest(base_path, data))
+    padding = -(len(header) + len(index)) % ALIGNMENT
+    with open(out, "wb") as file:
+        file.write(header)
+        file.write(index)
+        file.write(bytes(padding))
+        for chunk in chunks:
+            file.write(chunk)
+    print(f"Baked {len(names)} animations ({len(files)} frames, {offset / 1024:.1f} KiB) into {out} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+# Loads a baked bundle with a single mapping of the file, surfaces are built straight from the pixel buffers
+def load_bundle(path="data/assets.bundle", atlas=False, atlasSize=(2048, 2048)):
+    assets = AnimationAssets()
+    assets.atlas = atlas
+    assets.atlasSize = atlasSize
+
+    start = time.perf_counter()
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    magic, version, pixelFormat, count, indexSize, _ = BUNDLE_HEADER.unpack_from(view)
+    if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+        view.release()
+        buffer.close()
+        raise ValueError(f"{path} is not a version {BUNDLE_VERSION} asset bundle")
+    pixelFormat = pixelFormat.decode()
+
+    entries = []
+    offset = BUNDLE_HEADER.size
+    for _ in range(count):
+        name, offset = unpack_string(view, offset)
+        group, offset = unpack_string(view, offset)
+        img_dur, loop, frameCount = ANIMATION_ENTRY.unpack_from(view, offset)
+        offset += ANIMATION_ENTRY.size
+        frames = []
+        for _ in range(frameCount):
+            frames.append(FRAME_ENTRY.unpack_from(view, offset))
+            offset += FRAME_ENTRY.size
+        entries.append((name, group, img_dur, bool(loop), frames))
+    dataStart = BUNDLE_HEADER.size + indexSize
+    dataStart += -dataStart % ALIGNMENT
+    assets.timings["scan"] += time.perf_counter() - start
+
+    # Surfaces wrap the mapped memory until they are converted into their own pixels
+    start = time.perf_counter()
+    hasDisplay = pygame.display.get_surface() is not None
+    groups = {}
+    for name, group, img_dur, loop, frames in entries:
+        images = []
+        for width, height, frameOffset in frames:
+            begin = dataStart + frameOffset
+            img = pygame.image.frombuffer(view[begin:begin + width * height * 4], (width, height), pixelFormat)
+            img = img.convert() if hasDisplay else img.copy()
+            img.set_colorkey((0, 0, 0))
+            images.append(img)
+        assets[name] = Animation(images, img_dur, loop)
+        groups.setdefault(group, []).append(assets[name])
+    view.release()
+    buffer.close()
+    assets.timings["convert"] += time.perf_counter() - start
+
+    if atlas:
+        start = time.perf_counter()
+        for animations in groups.values():
+            pack_animations(animations, TextureAtlas(atlasSize))
+        assets.timings["atlas"] += time.perf_counter() - start
+    return assets
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bakes data/images and the animation data into a single asset bundle")
+    parser.add_argument("base_path", nargs="?", default="data/images/")
+    parser.add_argument("--data", default="data/animation_data.json")
+    parser.add_argument("--out", default="data/assets.bundle")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    bake(args.base_path, args.data, args.out, args.processes)
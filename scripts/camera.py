@@ -1,8 +1,10 @@
 # Modules
 import pygame
+from bisect import insort
 from pygame.constants import *
 
 # Scripts
+from scripts.framework import lerp_pos
 
 # An object which can be used in a camera class
 class CameraObject():
@@ -15,15 +17,73 @@ class CameraObject():
         self.layer = layer
         self.colour = colour
 
+# Persistent queue of draw items bucketed by layer, buckets are cleared rather than rebuilt every frame
+# Items are (surface, dest) for blits or (rect, colour) for filled rects
+class RenderQueue:
+    def __init__(self):
+        self.layers: dict[int, list[tuple]] = {}
+        self.order: list[int] = [] # layer keys in draw order, only changes when a new layer appears
+        self.rectLayers: set[int] = set() # layers which need rects drawn between blits this frame
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.layers.values())
+
+    # Creates the bucket for a new layer
+    def add_layer(self, layer):
+        bucket = self.layers[layer] = []
+        insort(self.order, layer)
+        return bucket
+
+    # Adds a draw item to its layer's bucket
+    def submit(self, item, layer, isRect=False):
+        bucket = self.layers.get(layer)
+        if bucket is None:
+            bucket = self.add_layer(layer)
+        bucket.append(item)
+        if isRect:
+            self.rectLayers.add(layer)
+
+    # Draws every bucket in layer order, layers without rects go to the surface in one blits call
+    def draw(self, surface):
+        for layer in self.order:
+            bucket = self.layers[layer]
+            if not bucket:
+                continue
+            if layer not in self.rectLayers:
+                surface.blits(bucket, False)
+                continue
+            start = 0
+            for i, item in enumerate(bucket):
+                if type(item[0]) is pygame.Rect:
+                    if start < i:
+                        surface.blits(bucket[start:i], False)
+                    pygame.draw.rect(surface, item[1], item[0])
+                    start = i + 1
+            if start < len(bucket):
+                surface.blits(bucket[start:], False)
+
+    # Empties the buckets but keeps them for the next frame
+    def clear(self):
+        for bucket in self.layers.values():
+            bucket.clear()
+        self.rectLayers.clear()
+
 # Camera System
 class Camera:
-    def __init__(self, resolution, scale, fullscreen=FULLSCREEN):
+    def __init__(self, resolution, scale, fullscreen=FULLSCREEN, headless=False):
         # Display Data
         self.resolution = resolution
         self.scale = scale
-        self.display = pygame.display.set_mode(resolution, fullscreen)
+        self.headless = headless
+        # Headless cameras render into an offscreen surface instead of opening a window
+        if headless:
+            self.display = pygame.Surface(resolution)
+        else:
+            self.display = pygame.display.set_mode(resolution, fullscreen)
         # Scroll Data
         self.trueScroll = [0, 0]
+        self.prevScroll: tuple[float, float] = (0, 0) # scroll before the last simulation step
+        self.simScroll = None # simulated scroll while an interpolated one is being rendered
         # Tracking Data
         self.isFollowing = None  # [target, [offsetX, offsetY]]
         self.isPanning = False
@@ -34,10 +94,17 @@ class Camera:
         self.min_scale = 1.5  # Set your desired minimum scale value here
         self.max_scale = 2  # Set your desired maximum scale value here
         self.zoom_speed = 1  # Set the zoom speed, adjust as needed
+        self.zoom_step = 0.05  # Zoom levels are snapped to this step so render targets can be reused
+        self.renderTargets: dict[float, pygame.Surface] = {} # quantized scale -> screen surface
         # Other
         self.renderOrder = {"x": False, "y": False, "layer": True}
-        self.screen = pygame.Surface((self.resolution[0] / self.scale, self.resolution[1] / self.scale))
+        self.renderScale = self.quantize_scale(self.scale)
+        self.screen = self.get_render_target(self.renderScale)
         self.targets = ()
+        self.renderQueue = RenderQueue()
+        self.blitBatch = []
+        # Render Stats (per frame)
+        self.renderStats = {"submitted": 0, "culled": 0, "drawn": 0}
 
     # Returns a screen size
     @property
@@ -49,6 +116,22 @@ class Camera:
     def scroll(self):
         return [int(self.trueScroll[0]), int(self.trueScroll[1])]
 
+    # Remembers the scroll before a simulation step
+    def store_previous(self):
+        self.prevScroll = (self.trueScroll[0], self.trueScroll[1])
+
+    # Renders from a scroll between the last two simulation steps until restore_scroll is called
+    def interpolate_scroll(self, alpha):
+        if self.simScroll is None:
+            self.simScroll = self.trueScroll
+        self.trueScroll = list(lerp_pos(self.prevScroll, self.simScroll, alpha))
+
+    # Puts back the simulated scroll after rendering
+    def restore_scroll(self):
+        if self.simScroll is not None:
+            self.trueScroll = self.simScroll
+            self.simScroll = None
+
     # Sets the render order
     def set_renderOrder(self, order):
         match order:
@@ -76,13 +159,29 @@ class Camera:
     def sortCameraObjects(self, cameraObjects):
         match self.renderOrder:
             case {"x": True}:
-                return sorted(cameraObjects, key=lambda camObj: camObj.entity.x)
+                return sorted(cameraObjects, key=lambda camObj: camObj.pos[0])
             case {"y": True}:
-                return sorted(cameraObjects, key=lambda camObj: camObj.entity.y)
+                return sorted(cameraObjects, key=lambda camObj: camObj.pos[1])
             case {"layer": True}:
                 return sorted(cameraObjects, key=lambda camObj: camObj.layer)
 
     
+    # Snaps a scale to the nearest zoom level
+    def quantize_scale(self, scale):
+        if self.zoom_step <= 0:
+            return scale
+        return round(round(scale / self.zoom_step) * self.zoom_step, 6)
+
+    # Returns the screen surface for a zoom level, surfaces are kept and reused when the level comes back
+    def get_render_target(self, scale):
+        target = self.renderTargets.get(scale)
+        if target is None:
+            size = (int(self.resolution[0] / scale), int(self.resolution[1] / scale))
+            # Matches the display format so the final upscale can write straight into the display
+            target = pygame.Surface(size, 0, self.display)
+            self.renderTargets[scale] = target
+        return target
+
     # Allows for zooming functionality
     def zoom(self, amount: float):
         # Incrementally update the desired scale
@@ -94,8 +193,11 @@ class Camera:
         # Smoothly transition the current scale towards the desired scale
         self.scale += (self.desired_scale - self.scale) * self.zoom_speed
 
-        tempScreen = pygame.transform.scale(self.screen.copy(), (self.resolution[0] / self.scale, self.resolution[1] / self.scale))
-        self.screen = tempScreen
+        # Only switch render targets when the zoom level actually changes
+        renderScale = self.quantize_scale(self.scale)
+        if renderScale != self.renderScale:
+            self.renderScale = renderScale
+            self.screen = self.get_render_target(renderScale)
 
     def followATarget(self, panStrength):
         if self.isPanning:
@@ -158,18 +260,70 @@ class Camera:
         elif self.isFollowing is not None:
             self.followATarget(panStrength)
     
-    # Renders camera objects and controls scrolling
-    def render(self, *camObjects):
-        sorted_camObjects = self.sortCameraObjects(camObjects)
+    # Removes camera objects whose bounds are outside of the view, with a pixel of margin for rounded scroll
+    def cullCameraObjects(self, cameraObjects):
+        left = self.trueScroll[0] - 1
+        top = self.trueScroll[1] - 1
+        right = self.trueScroll[0] + self.screenSize[0] + 1
+        bottom = self.trueScroll[1] + self.screenSize[1] + 1
+        visible = []
+        for camObj in cameraObjects:
+            entity = camObj.entity
+            if type(entity) is pygame.Rect:
+                x, y, width, height = entity
+            else:
+                x, y = camObj.pos
+                width, height = entity.get_size()
+            if x < right and x + width > left and y < bottom and y + height > top:
+                visible.append(camObj)
+        return visible
 
-        for camObj in sorted_camObjects:
-            match type(camObj.entity):
-                case pygame.Rect:
-                    tempRect = pygame.Rect(camObj.entity.x - self.scroll[0], camObj.entity.y - self.scroll[1], camObj.entity.width, camObj.entity.height) 
-                    pygame.draw.rect(self.screen, camObj.colour, tempRect)
-                case pygame.Surface:
-                    self.screen.blit(camObj.entity, ((camObj.pos[0] - self.trueScroll[0]), (camObj.pos[1] - self.trueScroll[1])))
+    # Draws camera objects in order, runs of surfaces are sent to the screen in a single blits call
+    def drawCameraObjects(self, cameraObjects):
+        scrollX, scrollY = self.trueScroll
+        rectScrollX, rectScrollY = self.scroll
+        batch = self.blitBatch
+        for camObj in cameraObjects:
+            entity = camObj.entity
+            if type(entity) is pygame.Rect:
+                if batch:
+                    self.screen.blits(batch, False)
+                    batch.clear()
+                pygame.draw.rect(self.screen, camObj.colour, (entity.x - rectScrollX, entity.y - rectScrollY, entity.width, entity.height))
+            else:
+                batch.append((entity, (camObj.pos[0] - scrollX, camObj.pos[1] - scrollY)))
+        if batch:
+            self.screen.blits(batch, False)
+            batch.clear()
 
-        # Apply zoom factor to the screen
-        self.display.blit(pygame.transform.scale(self.screen, self.resolution), (0, 0))
+    # Culls camera objects and queues the visible ones by layer, returns how many were queued
+    def queueCameraObjects(self, cameraObjects):
+        scrollX, scrollY = self.trueScroll
+        rectScrollX, rectScrollY = self.scroll
+        queue = self.renderQueue
+        visible = self.cullCameraObjects(cameraObjects)
+        for camObj in visible:
+            entity = camObj.entity
+            if type(entity) is pygame.Rect:
+                queue.submit((pygame.Rect(entity.x - rectScrollX, entity.y - rectScrollY, entity.width, entity.height), camObj.colour), camObj.layer, True)
+            else:
+                queue.submit((entity, (camObj.pos[0] - scrollX, camObj.pos[1] - scrollY)), camObj.layer)
+        return len(visible)
+
+    # Renders camera objects and controls scrolling
+    def render(self, *camObjects):
+        if self.renderOrder["layer"]:
+            # Bucketing keeps submission order within a layer, so no comparison sort is needed
+            drawn = self.queueCameraObjects(camObjects)
+            self.renderQueue.draw(self.screen)
+            self.renderQueue.clear()
+        else:
+            visible_camObjects = self.cullCameraObjects(camObjects)
+            drawn = len(visible_camObjects)
+            self.drawCameraObjects(self.sortCameraObjects(visible_camObjects))
+        self.renderStats["submitted"] = len(camObjects)
+        self.renderStats["culled"] = len(camObjects) - drawn
+        self.renderStats["drawn"] = drawn
 
+        # Apply zoom factor to the screen, scaling directly into the display
+        pygame.transform.scale(self.screen, self.display.get_size(), self.display)
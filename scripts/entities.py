@@ -3,9 +3,10 @@ import pygame, math
 
 # Scripts
 from scripts.camera import CameraObject, Camera
-from scripts.animation import Animation
+from scripts.animation import Animation, AnimationState
 from scripts.input import Controller, Keyboard
-from scripts.framework import get_center, collision_test, numCap
+from scripts.framework import get_center, collision_test, numCap, lerp_pos
+from scripts.physics import PhysicsWorld, BodyField, DirectionsField
 
 # Entity Class
 class Entity:
@@ -21,11 +22,14 @@ class Entity:
         self.movement: list[float, float] = [0, 0] # [x, y]
         # Animation Logic
         self.action: str = ""
+        self.animation: AnimationState = None
         self.anim_offset: tuple[int, int] = (0, 0)
         self.flip: bool = False
         self.set_action("idle")
         # Rect
         self.rect: pygame.Rect = pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
+        # Position before the last simulation step, rendering interpolates from it
+        self.prevPos: tuple[float, float] = (self.pos[0], self.pos[1])
 
     @property
     def x(self):
@@ -35,11 +39,14 @@ class Entity:
     def y(self):
         return self.pos[1]
 
-    # Sets an animation action
+    # Sets an animation action, the playback state is reused so changing action doesn't allocate
     def set_action(self, action):
         if action != self.action:
             self.action = action
-            self.animation = self.assets[self.tag + "/" + self.action].copy()
+            if self.animation is None:
+                self.animation = self.assets[self.tag + "/" + self.action].state()
+            else:
+                self.animation.set(self.assets[self.tag + "/" + self.action])
 
     # Gets the angle between 2 entities
     def get_entity_angle(self, entity_2):
@@ -73,10 +80,21 @@ class Entity:
         dis_y = point[1] - self.get_center()[1]
         return math.sqrt(dis_x ** 2 + dis_y ** 2)
     
-    # Returns a camera object
-    def render(self):
-        img = pygame.transform.flip(self.animation.img(), self.flip, False)
-        return CameraObject(img, (self.pos[0] + self.anim_offset[0], self.pos[1] + self.anim_offset[1]), 1)
+    # Remembers the position before a simulation step
+    def store_previous(self):
+        self.prevPos = (self.pos[0], self.pos[1])
+
+    # Returns the position between the last two simulation steps
+    def render_pos(self, alpha=1.0):
+        if alpha >= 1:
+            return self.pos[0], self.pos[1]
+        return lerp_pos(self.prevPos, self.pos, alpha)
+
+    # Returns a camera object, alpha interpolates between the last two simulation steps
+    def render(self, alpha=1.0):
+        img = self.animation.img(self.flip)
+        x, y = self.render_pos(alpha)
+        return CameraObject(img, (x + self.anim_offset[0], y + self.anim_offset[1]), 1)
     
     # Updates the current frame of an animation
     def update_animation(self, dt):
@@ -85,52 +103,94 @@ class Entity:
     # Returns the current image
     @property
     def current_image(self):
-        return pygame.transform.flip(self.animation.img(), self.flip, False)
+        return self.animation.img(self.flip)
+
+    # Returns the hit mask of the current image
+    @property
+    def current_mask(self):
+        return self.animation.mask(self.flip)
+
+    # Checks the masks of two entities for overlapping pixels where they are drawn, meant to run after their rects collide
+    def mask_collide(self, entity):
+        x = int(self.pos[0]) + self.anim_offset[0]
+        y = int(self.pos[1]) + self.anim_offset[1]
+        offset = (int(entity.pos[0]) + entity.anim_offset[0] - x, int(entity.pos[1]) + entity.anim_offset[1] - y)
+        return self.current_mask.overlap(entity.current_mask, offset) is not None
 
 # Physics Entity
+# Inside a PhysicsWorld these attributes are views over the entity's row of the world's arrays
 class PhysicsEntity(Entity):
-    def __init__(self, pos:list[int, int], size:list[int, int], tag:str, assets):
+    pos = BodyField("pos", True)
+    size = BodyField("size", True)
+    flip = BodyField("flip", kind=bool)
+    directions = DirectionsField()
+
+    def __init__(self, pos:list[int, int], size:list[int, int], tag:str, assets, world:PhysicsWorld=None):
+        # Physics World
+        self.world: PhysicsWorld = world
+        self.bodyIndex: int = world.add(self) if world is not None else None
         # Parameters
         super().__init__(pos, size, tag, assets)
         # Rects and Collisions
         self.collisions: dict[str, bool] = {'bottom': False, 'top': False, 'left': False, 'right': False}
 
-    # Checks for collisions based on movement direction
+    # Moves one axis at a time and stops at the first tile along the way, fast movement can't tunnel through thin tiles
+    # Tiles swept over between the old and new rect block the move as well as the ones overlapping the new rect
     def move(self, movement, tiles, dt):
+        objectCollisions = {'bottom': False, 'top': False, 'left': False, 'right': False}
+
         # x-axis
+        start = self.rect.copy()
         self.pos[0] += movement[0] * dt
         self.rect.x = int(self.pos[0])
-        tileCollisions = collision_test(self.rect, tiles)
-        objectCollisions = {'bottom': False, 'top': False, 'left': False, 'right': False}
-        for tile in tileCollisions:
+        if movement[0] != 0:
+            tileCollisions = collision_test(start.union(self.rect), tiles)
             if movement[0] > 0:
-                self.rect.right = tile.left
-                objectCollisions["right"] = True
-            elif movement[0] < 0:
-                self.rect.left = tile.right
-                objectCollisions["left"] = True
+                blocking = [tile.left for tile in tileCollisions if tile.left >= start.right or tile.colliderect(self.rect)]
+                if blocking:
+                    self.rect.right = min(blocking)
+                    objectCollisions["right"] = True
+            else:
+                blocking = [tile.right for tile in tileCollisions if tile.right <= start.left or tile.colliderect(self.rect)]
+                if blocking:
+                    self.rect.left = max(blocking)
+                    objectCollisions["left"] = True
         self.pos[0] = self.rect.x
 
         # y-axis
+        start = self.rect.copy()
         self.pos[1] += movement[1] * dt
         self.rect.y = int(self.pos[1])
-        tileCollisions = collision_test(self.rect, tiles)
-        for tile in tileCollisions:
+        if movement[1] != 0:
+            tileCollisions = collision_test(start.union(self.rect), tiles)
             if movement[1] > 0:
-                self.rect.bottom = tile.top
-                objectCollisions["bottom"] = True
-            elif movement[1] < 0:
-                self.rect.top = tile.bottom
-                objectCollisions["top"] = True
+                blocking = [tile.top for tile in tileCollisions if tile.top >= start.bottom or tile.colliderect(self.rect)]
+                if blocking:
+                    self.rect.bottom = min(blocking)
+                    objectCollisions["bottom"] = True
+            else:
+                blocking = [tile.bottom for tile in tileCollisions if tile.bottom <= start.top or tile.colliderect(self.rect)]
+                if blocking:
+                    self.rect.top = max(blocking)
+                    objectCollisions["top"] = True
         self.pos[1] = self.rect.y
         self.collisions = objectCollisions
+        if self.world is not None:
+            self.world.top[self.bodyIndex] = objectCollisions["top"]
+            self.world.bottom[self.bodyIndex] = objectCollisions["bottom"]
     
 # Player Class
 class Player(PhysicsEntity):
-    def __init__(self, id:int, pos:list[int, int], size:list[int, int], tag:str, assets):
+    momentum = BodyField("momentum", True)
+    strength = BodyField("strength", True)
+    cap = BodyField("cap", True)
+    airTimer = BodyField("airTimer")
+    isDashing = BodyField("dashing", kind=bool)
+
+    def __init__(self, id:int, pos:list[int, int], size:list[int, int], tag:str, assets, world:PhysicsWorld=None):
         # Parameters
         self.id = id
-        super().__init__(pos, size, tag, assets)
+        super().__init__(pos, size, tag, assets, world)
         # Movement Data
         self.momentum: list[float, float] = [0, 0] # [momentumX, momentumY]
         self.strength: list[float, float] = [0.5, 0.2] # [strengthX, strengthY]
@@ -150,12 +210,14 @@ class Player(PhysicsEntity):
         # Animation Data
         self.anim_offset: tuple[int, int] = (-3, -5)
         # Weapon
-        self.cursor: UserCursor = UserCursor([*pygame.mouse.get_pos()], [9, 9], "cursor1", self.assets)
+        # The cursor starts at the origin rather than the mouse so replays begin from the same state
+        self.cursor: UserCursor = UserCursor([0, 0], [9, 9], "cursor1", self.assets)
         self.weapon = None
         self.input: Keyboard | Controller = None
         # Player Data
         self.health = 100
         self.isAlive = True
+        self.verbose: bool = True # prints damage taken and deaths
 
     # Returns the position
     @property
@@ -165,29 +227,35 @@ class Player(PhysicsEntity):
     def apply_damage(self, entity, damageEntity):
         entity.health -= damageEntity.damage
         damageEntity.remove = True
-        print(f"Damage applied on player {entity.id}")
-        print(entity.health)
-        if self.health <= 0:
-            self.isAlive = False
-            print("Should be dead")
+        if self.verbose:
+            print(f"Damage applied on player {entity.id}")
+            print(entity.health)
+        if entity.health <= 0:
+            entity.isAlive = False
+            if self.verbose:
+                print("Should be dead")
     
-    def check_entity_collisions(self, players):
-        # Weapon updates
-        for bullet in self.weapon.bullets:
-            for player in players:
-                if player.id != self.id:
-                    bullet.check_collision_on_entity(player, lambda entity=player, damageEntity=bullet: self.apply_damage(entity, damageEntity))
-
+    # Remembers the positions of the player, weapon and bullets before a simulation step
+    def store_previous(self):
+        super().store_previous()
+        if self.weapon is not None:
+            self.weapon.store_previous()
 
-    
     # Gets camera objects of player, weapon and weapon bullets 
-    def render(self):
-        playerSprite = super().render()
+    def render(self, alpha=1.0):
+        playerSprite = super().render(alpha)
         if self.weapon is not None:
-            return playerSprite, self.weapon.render()
+            return playerSprite, self.weapon.render(alpha)
         else:
             return playerSprite
     
+    # Handles the input collected by the player's device since the last step
+    def apply_input(self):
+        for event in self.input.events():
+            self.input_events(event)
+        if self.world is not None:
+            self.world.inputScale[self.bodyIndex] = self.input.leftStick[0] if type(self.input) == Controller else 1
+
     # Handles player input
     def input_events(self, event):
         if type(self.input) == Controller:
@@ -247,45 +315,25 @@ class Player(PhysicsEntity):
                 self.canDash = False
                 self.dashCooldown[2] = True
         
-    # Input player movement and states
-    def update(self, tiles, dt, camera):
-        if self.airTimer < self.maxAirTimer:
-            self.isGrounded = True
-        else:
-            self.isGrounded = False
-        
-        # Dash Cooldown
-        if self.dashCooldown[2] != True:
-            self.dashCooldown[0] = self.dashCooldown[1]
-        else:
-            if self.dashCooldown[0] == 0:
-                self.dashCooldown[2] = False
-                self.dashCooldown[0] = self.dashCooldown[1]
-            else:
-                self.dashCooldown[0] -= 1
-
+    # Gravity, speed caps, friction and dashing, dt is measured in ticks of TICK_RATE
+    def update_momentum(self, dt=1):
         # Resets momentum when top collides
         if self.collisions["top"]:
             self.momentum[1] = 0.1
 
-        # Resets Jumps, momentum and airtimer when grounded
+        # Resets momentum and airtimer when grounded
         if self.collisions["bottom"]:
             self.momentum[1] = 0.1
             self.airTimer = 0
-            self.currentJumps = 0
-            self.isGrounded = True
-            if self.dashCooldown[2] != True:
-                self.canDash = True
         else:
             # Adds gravity
-            self.momentum[1] += self.strength[1]
+            self.momentum[1] += self.strength[1] * dt
             self.momentum[1] = numCap(self.momentum[1], self.cap[1]) # caps the gravity
-            self.airTimer += 1
-            self.isGrounded = False
+            self.airTimer += dt
         
         # x-axis movement
         if self.isDashing == False:
-            strength = self.strength[0]
+            strength = self.strength[0] * dt
             if self.directions["right"]:   
                 if type(self.input) == Controller:
                     strength *= self.input.leftStick[0]
@@ -295,7 +343,7 @@ class Player(PhysicsEntity):
             elif self.directions["left"]:
                 if type(self.input) == Controller:
                     strength *= self.input.leftStick[0]
-                self.momentum[0] += -self.strength[0]
+                self.momentum[0] += -self.strength[0] * dt
                 self.momentum[0] = numCap(self.momentum[0], -self.cap[0])
                 self.flip = True
             else:
@@ -305,13 +353,43 @@ class Player(PhysicsEntity):
         # Dashing
         if self.isDashing or (not(self.directions["right"]) and not(self.directions["left"])):
             if self.momentum[0] > 0:
-                self.momentum[0] -= self.strength[0]
+                self.momentum[0] -= self.strength[0] * dt
             elif self.momentum[0] < 0:
-                self.momentum[0] += self.strength[0]
+                self.momentum[0] += self.strength[0] * dt
 
         if ((self.momentum[0] <= 3) and (self.momentum[0] >= -3)) and self.isDashing:
             self.isDashing = False
 
+    # Input player movement and states
+    def update(self, tiles, dt, camera):
+        if self.airTimer < self.maxAirTimer:
+            self.isGrounded = True
+        else:
+            self.isGrounded = False
+        
+        # Dash Cooldown
+        if self.dashCooldown[2] != True:
+            self.dashCooldown[0] = self.dashCooldown[1]
+        else:
+            if self.dashCooldown[0] <= 0:
+                self.dashCooldown[2] = False
+                self.dashCooldown[0] = self.dashCooldown[1]
+            else:
+                self.dashCooldown[0] -= dt
+
+        # Resets Jumps when grounded
+        if self.collisions["bottom"]:
+            self.currentJumps = 0
+            self.isGrounded = True
+            if self.dashCooldown[2] != True:
+                self.canDash = True
+        else:
+            self.isGrounded = False
+
+        # Bodies in a PhysicsWorld have their momentum updated by PhysicsWorld.step
+        if self.world is None:
+            self.update_momentum(dt)
+
         # Checking for collision
         self.movement[0] = self.momentum[0]
         self.movement[1] = self.momentum[1]
@@ -327,10 +405,7 @@ class Player(PhysicsEntity):
 
         self.cursor.update(self, camera)
         if self.weapon:
-            self.weapon.update(self, camera)
-
-        # Input updates
-        self.input.update()
+            self.weapon.update(self, camera, dt, tiles)
 
 # Object Class TEMPORARY            
 class Object:
@@ -360,9 +435,9 @@ class UserCursor(Entity):
             self.pos[1] = self.pos[1] 
             self.set_pos(x, y)
         else:
-            x, y = pygame.mouse.get_pos()
+            x, y = player.input.mousePos
             self.set_pos(x, y)
-        self.cursor_in_space(camera.scale)
+        self.cursor_in_space(camera.renderScale)
 
     def cursor_in_space(self, camera_scale):
         self.location[0] = self.pos[0] // camera_scale
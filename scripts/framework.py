@@ -1,24 +1,38 @@
 # Modules
-import pygame
+import pygame, os
 from pygame.constants import *
 
+# Scripts
+from scripts.spatial import SpatialHash
+from scripts.rotation import rotation_cache
+
 MENU = 0
 PLAYING = 1
 PAUSED = 2
 
+# Uses SDL's dummy drivers so pygame runs without a display or sound card, call before pygame.init
+def init_headless():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
 # Returns a crop of a selected surface
 def clip(surf, x1, y1, x2, y2):
     clip = pygame.Rect(x1, y1, x2, y2)
     img = surf.subsurface(clip)
     return img
 
-# Rotates an image arount a pivot position
-def blit_rotate(image, pos, originPos, angle):
+# Rotates an image arount a pivot position, rotations are reused from the cache unless cache is None
+def blit_rotate(image, pos, originPos, angle, cache=rotation_cache):
+    if cache is not None:
+        angle = cache.quantize(angle)
     image_rect = image.get_rect(topleft = (pos[0] - originPos[0], pos[1]-originPos[1]))
     offset_center_to_pivot = pygame.math.Vector2(pos) - image_rect.center
     rotated_offset = offset_center_to_pivot.rotate(-angle)
     rotated_image_center = (pos[0] - rotated_offset.x, pos[1] - rotated_offset.y)
-    rotated_image = pygame.transform.rotate(image, angle)
+    if cache is not None:
+        rotated_image = cache.get(image, angle)
+    else:
+        rotated_image = pygame.transform.rotate(image, angle)
     rotated_image_rect = rotated_image.get_rect(center = rotated_image_center)
     return (rotated_image, rotated_image_rect)
 
@@ -38,6 +52,10 @@ def get_center(pos, size):
     y = pos[1] + int(size[1] / 2)
     return [x,y]
 
+# Interpolates between a previous and current position, alpha 0 is the previous one
+def lerp_pos(previous, current, alpha):
+    return previous[0] + (current[0] - previous[0]) * alpha, previous[1] + (current[1] - previous[1]) * alpha
+
 # Flips an image
 def flip_img(img,boolean=True, boolean_2=False):
     return pygame.transform.flip(img,boolean,boolean_2)
@@ -55,8 +73,10 @@ def numCap(number, target):
         else:
             return number
 
-# Checks for collisions between 2 objects   
+# Checks for collisions between 2 objects, object_list can be a list or a SpatialHash
 def collision_test(object_1,object_list):
+    if isinstance(object_list, SpatialHash):
+        return object_list.query(object_1)
     collision_list = []
     for obj in object_list:
         if obj.colliderect(object_1):
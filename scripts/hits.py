@@ -0,0 +1,86 @@
+# Scripts
+from scripts.spatial import SpatialHash
+
+# A bullet fired by attacker hitting target
+class HitEvent:
+    __slots__ = ("attacker", "target", "bullet")
+
+    def __init__(self, attacker, target, bullet):
+        self.attacker = attacker
+        self.target = target
+        self.bullet = bullet
+
+# Broadphase for bullets against players, players are kept in a grid and each bullet only looks at its own cells
+# precise: bullets whose rect collides also need a pixel of their frame to overlap the player's frame
+class HitDetector:
+    def __init__(self, cellSize=32, precise=True):
+        self.grid = SpatialHash(cellSize)
+        self.precise = precise
+        self.events: list[HitEvent] = []
+        # Stats (per pass)
+        self.stats = {"bullets": 0, "candidates": 0, "masks": 0, "hits": 0}
+
+    # Re-buckets the hittable entities by their rects, entities no longer in the list are dropped
+    def index(self, entities):
+        grid = self.grid
+        for entity in entities:
+            if entity in grid:
+                grid.update(entity)
+            else:
+                grid.insert(entity, entity.rect)
+        if len(grid) != len(entities):
+            present = {id(entity) for entity in entities}
+            for entity in list(grid):
+                if id(entity) not in present:
+                    grid.remove(entity)
+
+    # Returns the hits of every player's bullets this pass, a bullet hits at most one player
+    def detect(self, players):
+        self.index(players)
+        grid = self.grid
+        cells = grid.cells
+        cellSize = grid.cellSize
+        events = self.events
+        events.clear()
+        precise = self.precise
+        bulletCount = 0
+        candidateCount = 0
+        maskCount = 0
+
+        for attacker in players:
+            if attacker.weapon is None:
+                continue
+            for bullet in attacker.weapon.bullets:
+                if bullet.remove:
+                    continue
+                bulletCount += 1
+                rect = bullet.rect
+                # Bullets are smaller than a cell, so most only touch one
+                x1 = rect.left // cellSize
+                y1 = rect.top // cellSize
+                x2 = (rect.right - 1) // cellSize
+                y2 = (rect.bottom - 1) // cellSize
+                if x1 == x2 and y1 == y2:
+                    bucket = cells.get((x1, y1))
+                    if not bucket:
+                        continue
+                    candidates = bucket.values()
+                else:
+                    candidates = grid.candidates(rect)
+                for target in candidates:
+                    if target is attacker:
+                        continue
+                    candidateCount += 1
+                    if target.rect.colliderect(rect):
+                        if precise:
+                            maskCount += 1
+                            if not target.mask_collide(bullet):
+                                continue
+                        events.append(HitEvent(attacker, target, bullet))
+                        break
+
+        self.stats["bullets"] = bulletCount
+        self.stats["candidates"] = candidateCount
+        self.stats["masks"] = maskCount
+        self.stats["hits"] = len(events)
+        return events
@@ -0,0 +1,114 @@
+# Modules
+import pygame, os, json, time
+
+# Scripts
+from scripts.animation import Animation, AnimationState, scan_animations, load_images
+
+# Watches the image folders and animation data by polling mtimes, only changed animations are reloaded
+class AssetWatcher:
+    def __init__(self, assets, base_path="data/images/", data="data/animation_data.json", interval=0.5):
+        self.assets = assets
+        self.base_path = base_path
+        self.data = data
+        self.interval = interval # seconds between polls
+        self.lastPoll = 0
+        self.animations = scan_animations(base_path, data) # name -> (group, path, img_dur, loop)
+        self.signatures = {name: self.folder_signature(entry[1]) for name, entry in self.animations.items()}
+        self.dataSignature = self.file_signature(data)
+
+    # Returns the mtime and size of a file, or None if it is missing
+    def file_signature(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    # Returns the name, mtime and size of every image in a folder
+    def folder_signature(self, path):
+        try:
+            with os.scandir(path) as entries:
+                return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size) for entry in entries))
+        except OSError:
+            return None
+
+    # Checks for changes and reloads them, returns the names of reloaded animations
+    def poll(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self.lastPoll < self.interval:
+            return []
+        self.lastPoll = now
+
+        reloaded = []
+        dataSignature = self.file_signature(self.data)
+        if dataSignature != self.dataSignature:
+            self.dataSignature = dataSignature
+            reloaded.extend(self.reload_data())
+
+        # Folder listings are cheap, new animations are picked up without decoding the others
+        try:
+            animations = scan_animations(self.base_path, self.data)
+        except (OSError, ValueError) as e:
+            print(f"Error while scanning assets: {e}")
+            return reloaded
+        for name, entry in animations.items():
+            signature = self.folder_signature(entry[1])
+            if name in self.signatures and signature == self.signatures[name]:
+                continue
+            self.signatures[name] = signature
+            self.animations[name] = entry
+            if self.reload_animation(name, entry) and name not in reloaded:
+                reloaded.append(name)
+        return reloaded
+
+    # Applies changed durations and loop flags without touching any images
+    def reload_data(self):
+        try:
+            with open(self.data, "rb") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error while reloading animation data: {e}")
+            return []
+
+        changed = []
+        for name, entry in self.animations.items():
+            img_dur, loop = (data[name]["img_dur"], data[name]["loop"]) if name in data else (0.2, True)
+            self.animations[name] = (entry[0], entry[1], img_dur, loop)
+            if dict.__contains__(self.assets, name):
+                animation = dict.__getitem__(self.assets, name)
+                if (animation.img_duration, animation.loop) != (img_dur, loop):
+                    animation.img_duration = img_dur
+                    animation.loop = loop
+                    changed.append(name)
+            elif name in getattr(self.assets, "pending", {}):
+                self.assets.pending[name] = self.animations[name]
+        return changed
+
+    # Reloads the frames of one animation into the existing Animation so live entities see them next frame
+    def reload_animation(self, name, entry):
+        group, path, img_dur, loop = entry
+        # Deferred animations will be loaded from disk when first used anyway
+        if name in getattr(self.assets, "pending", {}):
+            self.assets.pending[name] = entry
+            return False
+        try:
+            images = load_images(path)
+        except (OSError, pygame.error) as e:
+            print(f"Error while reloading {name}: {e}")
+            return False
+        if not images:
+            return False
+
+        if dict.__contains__(self.assets, name):
+            animation = dict.__getitem__(self.assets, name)
+            animation.set_frames(images)
+            animation.img_duration = img_dur
+            animation.loop = loop
+            # Keep playback states inside the new frame count
+            for state in AnimationState.live:
+                if state.data is animation and state.frame >= len(images):
+                    state.frame = len(images) - 1 if not animation.loop else state.frame % len(images)
+        else:
+            self.assets[name] = Animation(images, img_dur, loop)
+        print(f"Reloaded {name} ({len(images)} frames)")
+        return True
@@ -10,12 +10,75 @@ class Controls:
     pause: int
     shoot: int
 
-class Controller:
-    def __init__(self, controls:Controls, joystick):
+# Controls fields in bit order, buttons are stored as bitfields of these
+BUTTONS = ("moveR", "moveL", "dash", "jump", "pause", "shoot")
+# Stick axes are quantized to 16 bits so live play and replays see exactly the same values
+AXIS_SCALE = 32767
+
+# Returns a stick axis snapped to the 16 bit grid
+def quantize_axis(value):
+    return round(max(-1, min(1, value)) * AXIS_SCALE) / AXIS_SCALE
+
+# Input state shared by the players using a device, events are collected between simulation steps
+# and handed to the players as one batch so recorded input replays exactly
+class InputDevice:
+    def __init__(self, controls:Controls):
         self.controls = controls
-        self.joystick = joystick
+        self.live = True # polls pygame, replayed devices have their state set by the replay instead
+        # Buttons since the last step
+        self.held: int = 0
+        self.pressed: int = 0
+        self.released: int = 0
+        # Axes
         self.leftStick = [0, 0]
         self.rightStick = [0, 0]
+        self.mousePos = (0, 0)
+
+    # Returns the bits of every button bound to a key or button code
+    def button_bits(self, code):
+        bits = 0
+        for bit, name in enumerate(BUTTONS):
+            if getattr(self.controls, name) == code:
+                bits |= 1 << bit
+        return bits
+
+    def press(self, bits):
+        self.held |= bits
+        self.pressed |= bits
+
+    def release(self, bits):
+        self.held &= ~bits
+        self.released |= bits
+
+    # Returns the press and release order of every bound code since the last step
+    # A code pressed and released within one step is replayed in the order that leaves it in its held state
+    def transitions(self):
+        changes = []
+        seen = set()
+        for bit, name in enumerate(BUTTONS):
+            mask = 1 << bit
+            code = getattr(self.controls, name)
+            if code in seen or not (self.pressed | self.released) & mask:
+                continue
+            seen.add(code)
+            if self.pressed & mask and self.released & mask:
+                if self.held & mask:
+                    changes.extend(((name, code, False), (name, code, True)))
+                else:
+                    changes.extend(((name, code, True), (name, code, False)))
+            else:
+                changes.append((name, code, bool(self.pressed & mask)))
+        return changes
+
+    # Forgets presses and releases once every player has seen them
+    def clear(self):
+        self.pressed = 0
+        self.released = 0
+
+class Controller(InputDevice):
+    def __init__(self, controls:Controls, joystick):
+        super().__init__(controls)
+        self.joystick = joystick
         self.deadzone = 0.1
 
     # Controls the deadzone - input below deadzone value is set to 0 to stop mouse drift
@@ -24,7 +87,7 @@ class Controller:
         for axis in axes:
             if abs(axis) < deadzone:
                 axis = 0
-            newAxes.append(axis)
+            newAxes.append(quantize_axis(axis))
 
         return newAxes
 
@@ -34,14 +97,53 @@ class Controller:
         self.rightStick = self.control_deadzone(self.deadzone, self.joystick.get_axis(2), self.joystick.get_axis(3))
 
     def update(self):
-        self.calculate_sticks()
-    
-class Keyboard:
+        if self.live:
+            self.calculate_sticks()
+
+    # Collects button events
+    def handle_event(self, event):
+        if not self.live:
+            return
+        if event.type == pygame.JOYBUTTONDOWN:
+            self.press(self.button_bits(event.button))
+        elif event.type == pygame.JOYBUTTONUP:
+            self.release(self.button_bits(event.button))
+
+    # Returns the events a player handles this step, sticks are read on every step
+    def events(self):
+        events = [pygame.event.Event(pygame.JOYBUTTONDOWN if down else pygame.JOYBUTTONUP, button=code) for name, code, down in self.transitions()]
+        return events or [pygame.event.Event(pygame.JOYAXISMOTION, axis=0, value=self.leftStick[0])]
+
+class Keyboard(InputDevice):
     def __init__(self, controls:Controls):
-        self.controls = controls
+        super().__init__(controls)
 
     def update(self):
-        pass
+        if self.live:
+            self.mousePos = pygame.mouse.get_pos()
+
+    # Collects key and mouse button events, shoot is a mouse button
+    def handle_event(self, event):
+        if not self.live:
+            return
+        if event.type == pygame.KEYDOWN:
+            self.press(self.button_bits(event.key) & ~(1 << BUTTONS.index("shoot")))
+        elif event.type == pygame.KEYUP:
+            self.release(self.button_bits(event.key) & ~(1 << BUTTONS.index("shoot")))
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == self.controls.shoot:
+            self.press(1 << BUTTONS.index("shoot"))
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == self.controls.shoot:
+            self.release(1 << BUTTONS.index("shoot"))
+
+    # Returns the events a player handles this step
+    def events(self):
+        events = []
+        for name, code, down in self.transitions():
+            if name == "shoot":
+                events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN if down else pygame.MOUSEBUTTONUP, button=code))
+            else:
+                events.append(pygame.event.Event(pygame.KEYDOWN if down else pygame.KEYUP, key=code))
+        return events
 
 # Checks for controllers and initialises them
 def controller_check():
@@ -50,4 +152,4 @@ def controller_check():
         joystick = pygame.joystick.Joystick(i)
         joystick.init()
         joysticks.append(joystick)
-    return joysticks
\ No newline at end of file
+    return joysticks
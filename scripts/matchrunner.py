@@ -0,0 +1,217 @@
+# Modules
+import pygame, multiprocessing, itertools, argparse, random, time, os
+from dataclasses import dataclass, asdict
+
+# Scripts
+from scripts.framework import init_headless
+from scripts.animation import load_animations
+from scripts.camera import Camera
+from scripts.input import Keyboard, BUTTONS
+from scripts.settings import Settings, DEFAULT_RESOLUTION
+from scripts.simulation import Simulation
+from scripts.timestep import TICK_RATE
+from scripts.weapons import Weapon
+
+# Balance values and rules of one kind of match
+@dataclass
+class MatchConfig:
+    players: int = 2
+    maxTicks: int = 60 * 120 # matches still running after this are draws
+    rate: float = 60 # simulation steps per second of game time
+    jumpStrength: float = -7
+    dashStrength: float = 6.2
+    bulletSpeed: float = 5
+    bulletDamage: int = 30
+
+MOVE_R = 1 << BUTTONS.index("moveR")
+MOVE_L = 1 << BUTTONS.index("moveL")
+DASH = 1 << BUTTONS.index("dash")
+JUMP = 1 << BUTTONS.index("jump")
+SHOOT = 1 << BUTTONS.index("shoot")
+# Players this far below the floor have fallen out of the level
+FALL_DEPTH = 300
+
+# Drives a player's keyboard from a seeded random number generator
+# Bots walk towards the nearest opponent, keep their distance, jump and dash now and then and shoot at it with some spread
+# margin: distance from the edges of the floor at which bots turn back
+class Bot:
+    def __init__(self, player, rng, spread=24, fireChance=0.1, margin=60):
+        self.player = player
+        self.rng = rng
+        self.spread = spread
+        self.fireChance = fireChance
+        self.margin = margin
+
+    # Taps buttons so they are pressed and released within one step
+    def tap(self, bits):
+        self.player.input.press(bits)
+        self.player.input.release(bits)
+
+    # Sets the device for the next step
+    def think(self, simulation):
+        player = self.player
+        device = player.input
+        rng = self.rng
+        opponents = [other for other in simulation.players if other is not player]
+        if not opponents:
+            return
+        target = min(opponents, key=lambda other: abs(other.pos[0] - player.pos[0]) + abs(other.pos[1] - player.pos[1]))
+
+        # Aim at the target through the camera, like a mouse would
+        camera = simulation.camera
+        x = target.pos[0] + target.size[0] / 2 + rng.uniform(-self.spread, self.spread)
+        y = target.pos[1] + target.size[1] / 2 + rng.uniform(-self.spread, self.spread)
+        device.mousePos = (int((x - camera.scroll[0]) * camera.renderScale), int((y - camera.scroll[1]) * camera.renderScale))
+
+        floor = simulation.floor
+        direction = None
+        if player.pos[0] < floor.left + self.margin:
+            direction = MOVE_R
+        elif player.pos[0] > floor.right - self.margin:
+            direction = MOVE_L
+        elif rng.random() < 0.05:
+            distance = target.pos[0] - player.pos[0]
+            if abs(distance) > 150:
+                direction = MOVE_R if distance > 0 else MOVE_L
+            else:
+                direction = rng.choice((MOVE_R, MOVE_L, 0))
+        if direction is not None:
+            device.release(device.held & (MOVE_R | MOVE_L) & ~direction)
+            if direction and not device.held & direction:
+                device.press(direction)
+        if rng.random() < 0.02:
+            self.tap(JUMP)
+        if rng.random() < 0.01:
+            self.tap(DASH)
+        if rng.random() < self.fireChance:
+            self.tap(SHOOT)
+
+# Animation assets of a worker process, loaded once by init_worker
+ASSETS = None
+
+# Sets up pygame without a display in a worker process
+# SDL would turn the pool's SIGTERM into a quit event and keep the worker alive
+def init_worker():
+    global ASSETS
+    init_headless()
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+    pygame.init()
+    ASSETS = load_animations("data/images/")
+
+# Plays one bot match as fast as possible and returns its stats, verbose keeps the players' damage prints
+def run_match(config, seed, verbose=False):
+    rng = random.Random(seed)
+    settings = Settings(headless=True)
+    simulation = Simulation(ASSETS, Camera(DEFAULT_RESOLUTION, 2, headless=True), verbose=verbose)
+    simulation.camera.set_targets(simulation.players, (0, -50))
+    simulation.camera.toggle_panning()
+    bots = []
+    spawn = simulation.floor.centerx - (config.players - 1) * 60
+    for i in range(config.players):
+        device = Keyboard(settings.keyboard)
+        device.live = False
+        weapon = Weapon([0, 0], [8, 8], "gun", ASSETS, (4, -3), 90, simulation.projectiles)
+        weapon.bulletSpeed = config.bulletSpeed
+        weapon.bulletDamage = config.bulletDamage
+        player = simulation.create_player([spawn + i * 120 + rng.randint(-20, 20), 0], weapon, device)
+        player.jumpStrength = config.jumpStrength
+        player.dashStrength = config.dashStrength
+        bots.append(Bot(player, random.Random(rng.random())))
+
+    dt = TICK_RATE / config.rate
+    fallLimit = simulation.floor.bottom + FALL_DEPTH
+    hits = kills = falls = 0
+    start = time.perf_counter()
+    while simulation.tick < config.maxTicks and len(simulation.players) > 1:
+        for bot in bots:
+            bot.think(simulation)
+        simulation.update(dt)
+        hits += len(simulation.hits.events)
+        for bot in [bot for bot in bots if not bot.player.isAlive or bot.player.pos[1] > fallLimit]:
+            if bot.player.isAlive:
+                falls += 1
+            else:
+                kills += 1
+            simulation.remove_player(bot.player)
+            bots.remove(bot)
+    seconds = time.perf_counter() - start
+
+    result = {"seed": seed, "ticks": simulation.tick, "seconds": seconds, "shots": simulation.bulletPool.acquired,
+              "hits": hits, "kills": kills, "falls": falls,
+              "winner": simulation.players[0].id if len(simulation.players) == 1 else None}
+    return result
+
+def run_job(job):
+    index, config, seed, verbose = job
+    return index, run_match(config, seed, verbose)
+
+# Plays every config against every seed across a process pool and returns the results of each config
+# Every config sees the same seeds so their stats can be compared match for match
+def run_matches(configs, seeds, workers=None, quiet=True):
+    jobs = [(index, config, seed, not quiet) for index, config in enumerate(configs) for seed in seeds]
+    results = [[] for _ in configs]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        init_worker()
+        for job in jobs:
+            index, result = run_job(job)
+            results[index].append(result)
+        return results
+    with multiprocessing.Pool(workers, init_worker) as pool:
+        for index, result in pool.imap_unordered(run_job, jobs):
+            results[index].append(result)
+    return results
+
+# Averages the results of one config
+def summarise(results):
+    count = max(len(results), 1)
+    ticks = sum(result["ticks"] for result in results)
+    shots = sum(result["shots"] for result in results)
+    hits = sum(result["hits"] for result in results)
+    return {"matches": len(results),
+            "ticksPerSecond": ticks / max(sum(result["seconds"] for result in results), 1e-9),
+            "meanTicks": ticks / count,
+            "hits": hits / count,
+            "accuracy": hits / max(shots, 1),
+            "deaths": sum(result["kills"] + result["falls"] for result in results) / count,
+            "falls": sum(result["falls"] for result in results) / count,
+            "draws": sum(result["winner"] is None for result in results) / count}
+
+# Splits a comma separated list of numbers
+def number_list(kind):
+    return lambda text: [kind(value) for value in text.split(",")]
+
+if __name__ == "__main__":
+    defaults = MatchConfig()
+    parser = argparse.ArgumentParser(description="Plays headless bot matches across every core and prints their stats, "
+                                                 "tuning values take comma separated lists and every combination is played")
+    parser.add_argument("--matches", type=int, default=100, help="matches per combination of tuning values")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first match")
+    parser.add_argument("--workers", type=int, default=None, help="processes, defaults to every core")
+    parser.add_argument("--players", type=int, default=defaults.players)
+    parser.add_argument("--ticks", type=int, default=defaults.maxTicks, help="ticks before a match is a draw")
+    parser.add_argument("--rate", type=float, default=defaults.rate)
+    parser.add_argument("--jump", type=number_list(float), default=[defaults.jumpStrength])
+    parser.add_argument("--dash", type=number_list(float), default=[defaults.dashStrength])
+    parser.add_argument("--bullet-speed", type=number_list(float), default=[defaults.bulletSpeed])
+    parser.add_argument("--bullet-damage", type=number_list(int), default=[defaults.bulletDamage])
+    parser.add_argument("--verbose", action="store_true", help="keep the players' prints")
+    args = parser.parse_args()
+
+    configs = [MatchConfig(args.players, args.ticks, args.rate, jump, dash, speed, damage)
+               for jump, dash, speed, damage in itertools.product(args.jump, args.dash, args.bullet_speed, args.bullet_damage)]
+    seeds = range(args.seed, args.seed + args.matches)
+    workers = args.workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    results = run_matches(configs, seeds, workers, not args.verbose)
+    wall = time.perf_counter() - start
+
+    totalTicks = sum(result["ticks"] for configResults in results for result in configResults)
+    print(f"{len(configs) * args.matches} matches on {workers} workers in {wall:.1f} s, {totalTicks / wall:.0f} ticks/s overall")
+    for config, configResults in zip(configs, results):
+        summary = summarise(configResults)
+        tuning = {key: value for key, value in asdict(config).items() if key not in ("players", "maxTicks", "rate")}
+        print(", ".join(f"{key} {value}" for key, value in tuning.items()))
+        print(f"  {summary['ticksPerSecond']:.0f} ticks/s per worker, {summary['meanTicks']:.0f} ticks per match, "
+              f"{summary['hits']:.1f} hits ({summary['accuracy'] * 100:.1f}% of shots), {summary['deaths']:.2f} deaths "
+              f"({summary['falls']:.2f} falls), {summary['draws'] * 100:.0f}% draws")
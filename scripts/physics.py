@@ -0,0 +1,172 @@
+# Modules
+import numpy as np
+
+# Structure of arrays holding every physics body, movement rules are applied to all bodies in one vectorised step
+class PhysicsWorld:
+    def __init__(self, capacity=64):
+        self.capacity: int = 0
+        self.count: int = 0 # rows in use, including freed ones
+        self.free: list[int] = []
+        self.bodies: list = [] # row -> entity
+        # Vectors [x, y]
+        self.pos = np.zeros((0, 2))
+        self.momentum = np.zeros((0, 2))
+        self.size = np.zeros((0, 2))
+        self.strength = np.zeros((0, 2))
+        self.cap = np.zeros((0, 2))
+        # Scalars
+        self.airTimer = np.zeros(0)
+        self.inputScale = np.zeros(0) # analogue stick scale applied when moving right
+        # Flags
+        self.active = np.zeros(0, dtype=bool)
+        self.flip = np.zeros(0, dtype=bool)
+        self.dashing = np.zeros(0, dtype=bool)
+        self.right = np.zeros(0, dtype=bool)
+        self.left = np.zeros(0, dtype=bool)
+        self.top = np.zeros(0, dtype=bool)
+        self.bottom = np.zeros(0, dtype=bool)
+        self.grow(capacity)
+
+    def __len__(self):
+        return self.count - len(self.free)
+
+    # Resizes every array, views handed out before this are no longer valid
+    def grow(self, capacity):
+        for name in ("pos", "momentum", "size", "strength", "cap", "airTimer", "inputScale",
+                     "active", "flip", "dashing", "right", "left", "top", "bottom"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.bodies.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    # Claims a row for an entity and returns its index
+    def add(self, entity):
+        if self.free:
+            index = self.free.pop()
+        else:
+            if self.count == self.capacity:
+                self.grow(max(self.capacity * 2, 16))
+            index = self.count
+            self.count += 1
+        for array in (self.pos, self.momentum, self.size, self.strength, self.cap):
+            array[index] = 0
+        self.airTimer[index] = 0
+        self.inputScale[index] = 1
+        self.active[index] = True
+        for flags in (self.flip, self.dashing, self.right, self.left, self.top, self.bottom):
+            flags[index] = False
+        self.bodies[index] = entity
+        return index
+
+    # Frees an entity's row
+    def remove(self, entity):
+        index = entity.bodyIndex
+        if self.bodies[index] is entity:
+            self.active[index] = False
+            self.bodies[index] = None
+            self.free.append(index)
+
+    # Gravity, speed caps and friction for every body at once, mirrors Player.update_momentum
+    def step(self, dt=1):
+        n = self.count
+        active = self.active[:n]
+        momentumX = self.momentum[:n, 0]
+        momentumY = self.momentum[:n, 1]
+        strengthX = self.strength[:n, 0]
+        top = self.top[:n] & active
+        bottom = self.bottom[:n] & active
+        dashing = self.dashing[:n]
+        right = self.right[:n]
+        left = self.left[:n] & ~right
+        idle = active & ~right & ~left
+
+        # Resets momentum on ceiling and floor collisions, otherwise applies capped gravity
+        momentumY[top] = 0.1
+        falling = active & ~bottom
+        momentumY[bottom] = 0.1
+        momentumY[falling] = np.minimum(momentumY[falling] + self.strength[:n, 1][falling] * dt, self.cap[:n, 1][falling])
+        self.airTimer[:n][bottom] = 0
+        self.airTimer[:n][falling] += dt
+
+        # x-axis movement
+        walking = active & ~dashing
+        movingRight = walking & right
+        movingLeft = walking & left
+        momentumX[movingRight] = np.minimum(momentumX[movingRight] + strengthX[movingRight] * dt * self.inputScale[:n][movingRight], self.cap[:n, 0][movingRight])
+        momentumX[movingLeft] = np.maximum(momentumX[movingLeft] - strengthX[movingLeft] * dt, -self.cap[:n, 0][movingLeft])
+        momentumX[walking & idle & (momentumX < -0.0001)] = 0
+        self.flip[:n][movingRight] = False
+        self.flip[:n][movingLeft] = True
+
+        # Friction while dashing or when there is no input
+        slowing = active & (dashing | idle)
+        momentumX -= np.where(slowing, np.sign(momentumX) * strengthX * dt, 0)
+
+        # Dashes end once the body has slowed down
+        dashing &= ~(active & (np.abs(momentumX) <= 3))
+
+# Attribute stored in a PhysicsWorld row when the entity belongs to a world, or on the entity otherwise
+class BodyField:
+    def __init__(self, column, vector=False, kind=float):
+        self.column = column
+        self.vector = vector
+        self.kind = kind
+
+    def __set_name__(self, owner, name):
+        self.private = "_" + name
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        world = entity.__dict__.get("world")
+        if world is None:
+            return entity.__dict__[self.private]
+        value = getattr(world, self.column)[entity.bodyIndex]
+        # Vectors are returned as views so item assignment writes into the world
+        return value if self.vector else self.kind(value)
+
+    def __set__(self, entity, value):
+        world = entity.__dict__.get("world")
+        if world is None:
+            entity.__dict__[self.private] = value
+        else:
+            getattr(world, self.column)[entity.bodyIndex] = value
+
+# Direction flags of a body, left and right live in the world so the step can read them
+class BodyDirections:
+    def __init__(self, world, index, directions):
+        self.world = world
+        self.index = index
+        self.other = {"up": False, "down": False}
+        for key, value in directions.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key == "right":
+            return bool(self.world.right[self.index])
+        if key == "left":
+            return bool(self.world.left[self.index])
+        return self.other[key]
+
+    def __setitem__(self, key, value):
+        if key == "right":
+            self.world.right[self.index] = value
+        elif key == "left":
+            self.world.left[self.index] = value
+        else:
+            self.other[key] = value
+
+# The directions dict of an entity, replaced by a BodyDirections view inside a world
+class DirectionsField:
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        return entity.__dict__["_directions"]
+
+    def __set__(self, entity, value):
+        world = entity.__dict__.get("world")
+        if world is not None:
+            value = BodyDirections(world, entity.bodyIndex, value)
+        entity.__dict__["_directions"] = value
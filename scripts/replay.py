@@ -0,0 +1,149 @@
+# Modules
+import struct, zlib, hashlib
+
+# Scripts
+from scripts.input import Keyboard, Controller, AXIS_SCALE
+
+REPLAY_MAGIC = b"SHRP"
+REPLAY_VERSION = 1
+# magic, version, dt per step, resolution, device count, step count, digest of the final state
+REPLAY_HEADER = struct.Struct("<4sHdHHHI20s")
+# held, pressed and released buttons, left and right stick, mouse position
+DEVICE_RECORD = struct.Struct("<BBB4h2h")
+KEYBOARD = 0
+CONTROLLER = 1
+
+# Clamps a value into a signed 16 bit field
+def int16(value):
+    return max(-32768, min(32767, int(value)))
+
+# Packs the state a device handed to the players on one step
+def pack_device(device):
+    return DEVICE_RECORD.pack(device.held, device.pressed, device.released,
+                              round(device.leftStick[0] * AXIS_SCALE), round(device.leftStick[1] * AXIS_SCALE),
+                              round(device.rightStick[0] * AXIS_SCALE), round(device.rightStick[1] * AXIS_SCALE),
+                              int16(device.mousePos[0]), int16(device.mousePos[1]))
+
+# Sets a device to a recorded state
+def unpack_device(device, buffer, offset):
+    held, pressed, released, lx, ly, rx, ry, mx, my = DEVICE_RECORD.unpack_from(buffer, offset)
+    device.held = held
+    device.pressed = pressed
+    device.released = released
+    device.leftStick = [lx / AXIS_SCALE, ly / AXIS_SCALE]
+    device.rightStick = [rx / AXIS_SCALE, ry / AXIS_SCALE]
+    device.mousePos = (mx, my)
+
+# XORs two records of the same length, unchanged input becomes zero bytes which compress to almost nothing
+def xor_bytes(a, b):
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+# Hashes the state replays are compared on
+def state_digest(simulation):
+    digest = hashlib.sha1()
+    digest.update(struct.pack("<I", simulation.tick))
+    for player in simulation.players:
+        digest.update(struct.pack("<8dii??", player.pos[0], player.pos[1], player.momentum[0], player.momentum[1],
+                                  player.airTimer, player.dashCooldown[0], player.cursor.pos[0], player.cursor.pos[1],
+                                  player.health, player.currentJumps, player.isDashing, player.flip))
+        if player.weapon is not None:
+            digest.update(struct.pack("<dI", player.weapon.rotation, len(player.weapon.bullets)))
+            for bullet in player.weapon.bullets:
+                digest.update(struct.pack("<2d", bullet.pos[0], bullet.pos[1]))
+    camera = simulation.camera
+    digest.update(struct.pack("<3d", camera.trueScroll[0], camera.trueScroll[1], camera.scale))
+    return digest.digest()
+
+# Records every device's state once per simulation step as fixed-width records
+# Each record is XORed with the one before it and the stream is compressed as it is written
+class ReplayRecorder:
+    def __init__(self, dt, resolution, level=6):
+        self.dt = dt
+        self.resolution = resolution
+        self.kinds: list[int] = None # device kinds, fixed by the first step
+        self.ticks: int = 0
+        self.previous = b""
+        self.compressor = zlib.compressobj(level)
+        self.chunks: list[bytes] = []
+
+    # Stores the devices' state for one step
+    def record(self, devices):
+        if self.kinds is None:
+            self.kinds = [CONTROLLER if isinstance(device, Controller) else KEYBOARD for device in devices]
+            self.previous = bytes(DEVICE_RECORD.size * len(devices))
+        elif len(devices) != len(self.kinds):
+            raise ValueError("input devices can't change during a recording")
+        record = b"".join(pack_device(device) for device in devices)
+        chunk = self.compressor.compress(xor_bytes(record, self.previous))
+        if chunk:
+            self.chunks.append(chunk)
+        self.previous = record
+        self.ticks += 1
+
+    # Writes the replay, the recording can carry on afterwards
+    def save(self, path, digest=bytes(20)):
+        kinds = self.kinds or []
+        header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.dt, self.resolution[0], self.resolution[1], len(kinds), self.ticks, digest)
+        with open(path, "wb") as file:
+            file.write(header)
+            file.write(bytes(kinds))
+            for chunk in self.chunks:
+                file.write(chunk)
+            file.write(self.compressor.copy().flush())
+
+# A loaded replay, read sets the devices to the recorded state of the next step
+class Replay:
+    def __init__(self, dt, resolution, kinds, ticks, digest, records):
+        self.dt = dt
+        self.resolution = resolution
+        self.kinds = kinds
+        self.ticks = ticks
+        self.digest = digest
+        self.records = records # XORed records of every step
+        self.tick = 0
+        self.previous = bytes(DEVICE_RECORD.size * len(kinds))
+
+    @property
+    def finished(self):
+        return self.tick >= self.ticks
+
+    # Creates devices that only take their state from the replay
+    def create_devices(self, settings):
+        devices = []
+        for kind in self.kinds:
+            device = Controller(settings.controller, None) if kind == CONTROLLER else Keyboard(settings.keyboard)
+            device.live = False
+            devices.append(device)
+        return devices
+
+    # Sets the devices to the next recorded step, devices keep their last state once the replay has finished
+    def read(self, devices):
+        if self.finished:
+            for device in devices:
+                device.clear()
+            return
+        size = DEVICE_RECORD.size * len(self.kinds)
+        start = self.tick * size
+        record = xor_bytes(self.records[start:start + size], self.previous)
+        for index, device in enumerate(devices):
+            unpack_device(device, record, index * DEVICE_RECORD.size)
+        self.previous = record
+        self.tick += 1
+
+    # Checks the simulation against the state the recording ended in
+    def matches(self, simulation):
+        return state_digest(simulation) == self.digest
+
+# Loads a replay written by ReplayRecorder
+def load_replay(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version, dt, width, height, count, ticks, digest = REPLAY_HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay")
+    offset = REPLAY_HEADER.size
+    kinds = list(data[offset:offset + count])
+    records = zlib.decompress(data[offset + count:])
+    if len(records) != ticks * count * DEVICE_RECORD.size:
+        raise ValueError(f"{path} is truncated")
+    return Replay(dt, (width, height), kinds, ticks, digest, records)
@@ -0,0 +1,103 @@
+# Modules
+import pygame
+from collections import OrderedDict
+
+# Caches rotated surfaces by (surface, quantized angle, flip) with LRU eviction under a memory budget
+class RotationCache:
+    def __init__(self, angleStep=1.0, memoryBudget=16 * 1024 * 1024):
+        self.angleStep: float = angleStep
+        self.memoryBudget: int = memoryBudget # bytes
+        self.entries: OrderedDict[tuple, list] = OrderedDict() # key -> [source, rotated, bytes, mask]
+        self.memory: int = 0
+        # Counters
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Snaps an angle to the nearest step in the range [0, 360)
+    def quantize(self, angle):
+        if self.angleStep <= 0:
+            return angle % 360
+        return (round(angle / self.angleStep) * self.angleStep) % 360
+
+    # Returns the cache entry of a rotation, [source, rotated, bytes, mask], rotating on a miss
+    def entry(self, image, angle, flip=False):
+        angle = self.quantize(angle)
+        key = (id(image), angle, flip)
+        entry = self.entries.get(key)
+        # The source is kept in the entry so a reused id can't return another surface's rotation
+        if entry is not None and entry[0] is image:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        source = pygame.transform.flip(image, True, False) if flip else image
+        rotated = pygame.transform.rotate(source, angle)
+        size = rotated.get_width() * rotated.get_height() * rotated.get_bytesize()
+        if entry is not None:
+            self.memory -= entry[2]
+        entry = [image, rotated, size, None]
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.memory += size
+        self.evict()
+        return entry
+
+    # Returns a rotated (and optionally flipped) copy of an image
+    def get(self, image, angle, flip=False):
+        return self.entry(image, angle, flip)[1]
+
+    # Returns the hit mask of the rotated copy, built the first time it is asked for and evicted with the surface
+    def mask(self, image, angle, flip=False):
+        entry = self.entry(image, angle, flip)
+        if entry[3] is None:
+            entry[3] = pygame.mask.from_surface(entry[1])
+            size = (entry[1].get_width() * entry[1].get_height() + 7) // 8
+            entry[2] += size
+            self.memory += size
+        return entry[3]
+
+    # Drops the least recently used rotations until the cache fits its memory budget
+    def evict(self):
+        while self.memory > self.memoryBudget and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self.memory -= entry[2]
+            self.evictions += 1
+
+    # Changes the memory budget, evicting if needed
+    def set_budget(self, memoryBudget):
+        self.memoryBudget = memoryBudget
+        self.evict()
+
+    # Changes the angle step, cached rotations are dropped as their keys no longer match
+    def set_angle_step(self, angleStep):
+        self.angleStep = angleStep
+        self.clear()
+
+    # Returns the hit/miss counters and memory usage
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": self.hits / total if total else 0,
+            "entries": len(self.entries),
+            "memory": self.memory,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.memory = 0
+
+# Shared cache used by blit_rotate and bullets
+rotation_cache = RotationCache()
@@ -0,0 +1,333 @@
+# Modules
+import pygame, asyncio, struct, zlib, time, random, argparse
+
+# Scripts
+from scripts.framework import init_headless
+from scripts.animation import load_animations
+from scripts.camera import Camera
+from scripts.input import Keyboard, Controller
+from scripts.replay import DEVICE_RECORD, KEYBOARD, CONTROLLER, pack_device, unpack_device, xor_bytes
+from scripts.settings import Settings, DEFAULT_RESOLUTION
+from scripts.simulation import Simulation
+from scripts.snapshot import SnapshotRing
+from scripts.timestep import TICK_RATE
+from scripts.weapons import Weapon
+
+# Packet types
+JOIN = 0
+WELCOME = 1
+INPUT = 2
+SNAPSHOT = 3
+LEAVE = 4
+# type, device kind
+JOIN_PACKET = struct.Struct("<BB")
+# type, player id, tick
+WELCOME_PACKET = struct.Struct("<BII")
+# type, input sequence, last snapshot tick the client decoded, followed by a DEVICE_RECORD
+INPUT_PACKET = struct.Struct("<BII")
+# type, tick, tick the snapshot is a delta against, size of the snapshot, followed by the compressed delta
+SNAPSHOT_PACKET = struct.Struct("<BIII")
+NO_BASE = 0xFFFFFFFF
+# Largest snapshot payload sent in one datagram
+MAX_PAYLOAD = 60000
+
+# XORs a snapshot against a base snapshot cut or zero padded to its length, applying it twice gives the snapshot back
+def delta_bytes(data, base):
+    if base is None:
+        return bytes(data)
+    base = bytes(base[:len(data)])
+    if len(base) < len(data):
+        base += bytes(len(data) - len(base))
+    return xor_bytes(bytes(data), base)
+
+# A connected client and the input it has sent since the last tick
+class RemoteClient:
+    def __init__(self, address, player, device):
+        self.address = address
+        self.player = player
+        self.device = device
+        self.sequence: int = -1 # newest input packet applied
+        self.ack: int = NO_BASE # newest snapshot the client has decoded
+        self.lastSeen: float = time.perf_counter()
+
+# Authoritative match server, simulates the players of every client and broadcasts snapshots over UDP
+# Snapshots are XORed against the last one each client acknowledged and compressed with zlib
+class MatchServer:
+    def __init__(self, assets, rate=60, history=64, timeout=5):
+        self.rate: float = rate
+        self.dt: float = TICK_RATE / rate
+        self.timeout: float = timeout
+        self.settings = Settings(headless=True)
+        self.simulation = Simulation(assets, Camera(DEFAULT_RESOLUTION, 2, headless=True))
+        # Every player shares one camera like local multiplayer, so aiming works the same
+        self.simulation.camera.set_targets(self.simulation.players, (0, -50))
+        self.simulation.camera.toggle_panning()
+        self.snapshots = SnapshotRing(self.simulation, history)
+        self.clients: dict[tuple, RemoteClient] = {}
+        self.transport = None
+        self.running = False
+        # Stats
+        self.stats = {"ticks": 0, "late": 0, "simTime": 0.0, "sendTime": 0.0, "maxTickTime": 0.0,
+                      "packetsIn": 0, "bytesIn": 0, "packetsOut": 0, "bytesOut": 0, "snapshotBytes": 0, "oversized": 0}
+
+    # Adds a player for a new client
+    def join(self, address, kind):
+        if kind == CONTROLLER:
+            device = Controller(self.settings.controller, None)
+        else:
+            device = Keyboard(self.settings.keyboard)
+        device.live = False
+        assets = self.simulation.assets
+        weapon = Weapon([0, 0], [8, 8], "gun", assets, (4, -3), 90, self.simulation.projectiles)
+        player = self.simulation.create_player([len(self.simulation.players) * 20, 0], weapon, device)
+        client = RemoteClient(address, player, device)
+        self.clients[address] = client
+        return client
+
+    def leave(self, address):
+        client = self.clients.pop(address, None)
+        if client is not None:
+            self.simulation.remove_player(client.player)
+
+    # Handles one datagram from a client
+    def receive(self, data, address):
+        self.stats["packetsIn"] += 1
+        self.stats["bytesIn"] += len(data)
+        if not data:
+            return
+        kind = data[0]
+        client = self.clients.get(address)
+        if kind == JOIN and len(data) >= JOIN_PACKET.size:
+            if client is None:
+                client = self.join(address, JOIN_PACKET.unpack_from(data)[1])
+            self.send(WELCOME_PACKET.pack(WELCOME, client.player.id, self.simulation.tick), address)
+        elif kind == INPUT and client is not None and len(data) >= INPUT_PACKET.size + DEVICE_RECORD.size:
+            _, sequence, ack = INPUT_PACKET.unpack_from(data)
+            client.lastSeen = time.perf_counter()
+            if ack != NO_BASE and (client.ack == NO_BASE or ack > client.ack):
+                client.ack = ack
+            if sequence <= client.sequence:
+                return
+            client.sequence = sequence
+            # Presses and releases add up until the next tick, held buttons and axes take the newest state
+            device = client.device
+            pressed = device.pressed
+            released = device.released
+            unpack_device(device, data, INPUT_PACKET.size)
+            device.pressed |= pressed
+            device.released |= released
+        elif kind == LEAVE:
+            self.leave(address)
+
+    def send(self, packet, address):
+        self.transport.sendto(packet, address)
+        self.stats["packetsOut"] += 1
+        self.stats["bytesOut"] += len(packet)
+
+    # Returns the snapshot packet for a base tick, clients with the same base share one encoding
+    def encode(self, tick, snapshot, base, packets):
+        packet = packets.get(base)
+        if packet is None:
+            baseData = self.snapshots.view(base) if base != NO_BASE and base in self.snapshots else None
+            if baseData is None:
+                base = NO_BASE
+            payload = zlib.compress(delta_bytes(snapshot, baseData), 1)
+            packet = SNAPSHOT_PACKET.pack(SNAPSHOT, tick, base, len(snapshot)) + payload
+            packets[base] = packet
+        return packet
+
+    # Simulates one tick and sends every client its snapshot
+    def tick(self):
+        start = time.perf_counter()
+        for address in [address for address, client in self.clients.items() if start - client.lastSeen > self.timeout]:
+            self.leave(address)
+        self.simulation.update(self.dt)
+        simulated = time.perf_counter()
+
+        self.snapshots.save()
+        tick = self.simulation.tick
+        snapshot = self.snapshots.view(tick)
+        self.stats["snapshotBytes"] += len(snapshot) * len(self.clients)
+        packets = {}
+        for client in self.clients.values():
+            packet = self.encode(tick, snapshot, client.ack, packets)
+            if len(packet) > MAX_PAYLOAD:
+                self.stats["oversized"] += 1
+                continue
+            self.send(packet, client.address)
+        end = time.perf_counter()
+
+        self.stats["ticks"] += 1
+        self.stats["simTime"] += simulated - start
+        self.stats["sendTime"] += end - simulated
+        self.stats["maxTickTime"] = max(self.stats["maxTickTime"], end - start)
+
+    # Runs the tick loop at the server's rate, ticks that fall behind are run straight away
+    async def run(self, seconds=None):
+        loop = asyncio.get_running_loop()
+        step = 1 / self.rate
+        start = loop.time()
+        nextTick = start
+        self.running = True
+        while self.running and (seconds is None or loop.time() - start < seconds):
+            self.tick()
+            nextTick += step
+            delay = nextTick - loop.time()
+            if delay < 0:
+                self.stats["late"] += 1
+                nextTick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    # Opens the UDP socket
+    async def listen(self, host="127.0.0.1", port=0):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: ServerProtocol(self), local_addr=(host, port))
+        return self.transport.get_extra_info("sockname")
+
+    def close(self):
+        self.running = False
+        if self.transport is not None:
+            self.transport.close()
+
+    # Prints the averages of the stats
+    def report(self, seconds):
+        stats = self.stats
+        ticks = max(stats["ticks"], 1)
+        print(f"{len(self.clients)} clients, {stats['ticks']} ticks in {seconds:.1f} s ({stats['late']} late)")
+        print(f"  tick cpu:  {(stats['simTime'] + stats['sendTime']) / ticks * 1000:.2f} ms mean "
+              f"(simulate {stats['simTime'] / ticks * 1000:.2f}, snapshots {stats['sendTime'] / ticks * 1000:.2f}), {stats['maxTickTime'] * 1000:.2f} ms max")
+        print(f"  out:       {stats['bytesOut'] / seconds / 1024:.1f} KiB/s ({stats['bytesOut'] / seconds / max(len(self.clients), 1) / 1024:.2f} KiB/s per client), "
+              f"{stats['bytesOut'] / max(stats['snapshotBytes'], 1) * 100:.1f}% of raw snapshots, {stats['oversized']} oversized")
+        print(f"  in:        {stats['bytesIn'] / seconds / 1024:.1f} KiB/s, {stats['packetsIn']} packets")
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, address):
+        self.server.receive(data, address)
+
+# Client side of the protocol, decodes snapshots against the ones it already has and sends its device state every tick
+class MatchClient(asyncio.DatagramProtocol):
+    def __init__(self, device, kind=KEYBOARD, history=64):
+        self.device = device
+        self.kind = kind
+        self.history = history
+        self.transport = None
+        self.playerId = None
+        self.sequence = 0
+        self.snapshots: dict[int, bytes] = {} # tick -> decoded snapshot
+        self.latest: int = NO_BASE
+        # Stats
+        self.received = 0
+        self.decoded = 0
+        self.missingBase = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.sendto(JOIN_PACKET.pack(JOIN, self.kind))
+
+    def datagram_received(self, data, address):
+        self.received += 1
+        kind = data[0]
+        if kind == WELCOME:
+            self.playerId = WELCOME_PACKET.unpack_from(data)[1]
+        elif kind == SNAPSHOT:
+            _, tick, base, size = SNAPSHOT_PACKET.unpack_from(data)
+            if self.latest != NO_BASE and tick <= self.latest:
+                return
+            baseData = None
+            if base != NO_BASE:
+                baseData = self.snapshots.get(base)
+                if baseData is None:
+                    self.missingBase += 1
+                    return
+            delta = zlib.decompress(data[SNAPSHOT_PACKET.size:])
+            if len(delta) != size:
+                return
+            self.snapshots[tick] = delta_bytes(delta, baseData)
+            self.latest = tick
+            self.decoded += 1
+            for old in [old for old in self.snapshots if old <= tick - self.history]:
+                del self.snapshots[old]
+
+    # Sends the device's state and acknowledges the newest snapshot, then clears its presses
+    def send_input(self):
+        if self.transport is None:
+            return
+        if self.playerId is None:
+            self.transport.sendto(JOIN_PACKET.pack(JOIN, self.kind))
+            return
+        self.transport.sendto(INPUT_PACKET.pack(INPUT, self.sequence, self.latest) + pack_device(self.device))
+        self.sequence += 1
+        self.device.clear()
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.sendto(bytes([LEAVE]))
+            self.transport.close()
+
+# Presses random buttons and moves the mouse around like a restless player
+def random_input(device, rng):
+    device.mousePos = (rng.randint(0, DEFAULT_RESOLUTION[0] - 1), rng.randint(0, DEFAULT_RESOLUTION[1] - 1))
+    if rng.random() < 0.2:
+        bit = 1 << rng.randrange(6)
+        if device.held & bit:
+            device.release(bit)
+        else:
+            device.press(bit)
+
+# Runs a server and many bot clients on localhost and reports the server's bandwidth and cpu time per tick
+async def load_test(clients=16, seconds=10, rate=60, seed=0):
+    pygame.init()
+    server = MatchServer(load_animations("data/images/"), rate)
+    host, port = await server.listen()
+    loop = asyncio.get_running_loop()
+    settings = Settings(headless=True)
+    bots = []
+    for i in range(clients):
+        device = Keyboard(settings.keyboard)
+        device.live = False
+        _, client = await loop.create_datagram_endpoint(lambda: MatchClient(device), remote_addr=(host, port))
+        bots.append((client, random.Random(seed + i)))
+
+    async def drive():
+        while server.running or server.stats["ticks"] == 0:
+            for client, rng in bots:
+                random_input(client.device, rng)
+                client.send_input()
+            await asyncio.sleep(1 / rate)
+
+    driver = asyncio.ensure_future(drive())
+    await server.run(seconds)
+    server.running = False
+    await driver
+    server.report(seconds)
+    decoded = sum(client.decoded for client, _ in bots)
+    missing = sum(client.missingBase for client, _ in bots)
+    print(f"  clients:   {decoded} snapshots decoded, {missing} dropped for a missing base")
+    for client, _ in bots:
+        client.close()
+    server.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a headless match server, or a load test with simulated clients on localhost")
+    parser.add_argument("--serve", action="store_true", help="only run the server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--rate", type=float, default=60, help="ticks per second")
+    parser.add_argument("--clients", type=int, default=16, help="simulated clients for the load test")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    init_headless()
+    if args.serve:
+        async def serve():
+            pygame.init()
+            server = MatchServer(load_animations("data/images/"), args.rate)
+            print(f"Serving on {await server.listen(args.host, args.port)}")
+            await server.run()
+        asyncio.run(serve())
+    else:
+        asyncio.run(load_test(args.clients, args.seconds, args.rate))
@@ -5,10 +5,18 @@ from pygame.constants import *
 # Scripts
 from scripts.input import Controls
 
+DEFAULT_RESOLUTION = (1280, 720)
+
 class Settings:
-    def __init__(self):
-        self.resolution = (pygame.display.Info().current_w, pygame.display.Info().current_h)
+    def __init__(self, headless=False):
+        # Without a display there is no monitor to match
+        if headless or not pygame.display.get_init():
+            self.resolution = DEFAULT_RESOLUTION
+        else:
+            self.resolution = (pygame.display.Info().current_w, pygame.display.Info().current_h)
         self.targetFPS = 120
+        self.simulationRate = 60 # fixed simulation steps per second, independent of targetFPS
+        self.maxCatchUpSteps = 5 # simulation steps allowed per rendered frame
         self.keyboard = Controls(K_d, K_a, K_LSHIFT, K_SPACE, K_ESCAPE, 1)
         self.controller = Controls(0, 0, 1, 0, 7, 20)
 
@@ -29,7 +37,7 @@ class Settings:
             print(f"Error while saving settings: {e}")
 
     @staticmethod
-    def load_from_file(filename):
+    def load_from_file(filename, headless=False):
         try:
             with open(filename, 'rb') as file:
                 settings = pickle.load(file)
@@ -37,4 +45,4 @@ class Settings:
             return settings
         except Exception as e:
             print(f"Error while loading settings: {e}")
-            return Settings()
\ No newline at end of file
+            return Settings(headless)
\ No newline at end of file
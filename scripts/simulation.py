@@ -0,0 +1,116 @@
+# Modules
+import pygame
+
+# Scripts
+from scripts.animation import AnimationState
+from scripts.entities import Player
+from scripts.hits import HitDetector
+from scripts.physics import PhysicsWorld
+from scripts.weapons import BulletPool, ProjectileManager
+from scripts.spatial import SpatialHash
+from scripts.tilemap import load_tilemap
+
+# Bullets expire this many pixels past every side of the level
+BOUNDS_MARGIN = 2000
+
+# Game state and rules without any window, input polling or rendering
+class Simulation:
+    def __init__(self, assets, camera, vectorised=True, verbose=True):
+        self.assets = assets
+        self.camera = camera
+        # Entities, vectorised simulations step every player's momentum together in a PhysicsWorld
+        self.players: list[Player] = []
+        self.nextPlayerId = 0
+        self.verbose: bool = verbose # players print the damage they deal
+        # Animation states advanced each step, only players animate, weapons, cursors and bullets hold their frame
+        self.animated: list[AnimationState] = []
+        self.physics: PhysicsWorld = PhysicsWorld() if vectorised else None
+        # Level
+        self.floor = pygame.Rect(0, 100, 3000, 20)
+        # Bullets shared by every weapon in the match, they expire after 3 seconds or BOUNDS_MARGIN outside the level
+        self.bulletPool = BulletPool(assets, capacity=64)
+        self.projectiles = ProjectileManager(self.bulletPool, self.floor.inflate(BOUNDS_MARGIN * 2, BOUNDS_MARGIN * 2))
+        self.hits = HitDetector()
+        self.tiles = SpatialHash.from_rects([self.floor])
+        self.tilemap = None
+        # Input, a recorder stores what every device did on each step and a replay can stand in for the devices
+        self.recorder = None
+        self.replay = None
+        # Ticks simulated so far
+        self.tick = 0
+
+    # Loads a .csv map and uses its merged rects for collisions
+    def load_level(self, filename, tileSize=16):
+        self.tilemap = load_tilemap(filename, tileSize)
+        self.tiles = self.tilemap.collision_index()
+        self.tiles.insert(self.floor)
+        size = self.tilemap.size
+        self.projectiles.bounds = self.floor.union(pygame.Rect(0, 0, size[0], size[1])).inflate(BOUNDS_MARGIN * 2, BOUNDS_MARGIN * 2)
+
+    # Adds a player controlled by an input device
+    def create_player(self, pos, weapon, inputDevice):
+        player = Player(self.nextPlayerId, pos, [8, 13], "player", self.assets, self.physics)
+        self.nextPlayerId += 1
+        player.verbose = self.verbose
+        player.weapon = weapon
+        player.input = inputDevice
+        self.players.append(player)
+        self.animated.append(player.animation)
+        return player
+
+    # Removes a player, its bullets go back to their pool
+    def remove_player(self, player):
+        self.players.remove(player)
+        self.animated.remove(player.animation)
+        if player.weapon is not None:
+            for bullet in player.weapon.bullets:
+                player.weapon.pool.release(bullet)
+            player.weapon.bullets.clear()
+        if self.physics is not None:
+            self.physics.remove(player)
+
+    # Input devices of the players in the order they were first used
+    @property
+    def devices(self):
+        devices = []
+        for player in self.players:
+            if player.input not in devices:
+                devices.append(player.input)
+        return devices
+
+    # Hands the input collected since the last step to the players
+    # Devices are polled once here, before recording, so every player sharing a device sees the recorded state
+    def apply_input(self):
+        devices = self.devices
+        for device in devices:
+            device.update()
+        if self.replay is not None:
+            self.replay.read(devices)
+        if self.recorder is not None:
+            self.recorder.record(devices)
+        for player in self.players:
+            player.apply_input()
+        for device in devices:
+            device.clear()
+
+    # Advances the simulation by one step, dt is measured in ticks of TICK_RATE
+    def update(self, dt):
+        self.apply_input()
+
+        player: Player
+        for player in self.players:
+            player.store_previous()
+        self.camera.store_previous()
+
+        if self.physics is not None:
+            self.physics.step(dt)
+
+        for player in self.players:
+            player.update(self.tiles, dt, self.camera)
+
+        # Bullets are checked against players once everyone has moved
+        for hit in self.hits.detect(self.players):
+            hit.attacker.apply_damage(hit.target, hit.bullet)
+        AnimationState.update_all(self.animated, dt)
+        self.camera.update(dt)
+        self.tick += 1
@@ -0,0 +1,215 @@
+# Modules
+import struct
+
+# tick, player count, true and previous scroll, scale, desired scale
+HEADER = struct.Struct("<IH6d")
+# Doubles: position, previous position, momentum, air timer, dash cooldown timers, animation time, cursor position and location,
+#          weapon position, previous position, rotation and animation time
+# Ints: health, current jumps, action, animation frame, weapon action, weapon animation frame, bullet count
+# Flags: see PLAYER_FLAGS
+PLAYER = struct.Struct("<20d7iI")
+# Doubles: position, previous position, rotation, speed, age, distance travelled, animation time
+# Ints: damage, animation frame, flags (remove, animation done)
+BULLET = struct.Struct("<9d2iB")
+PLAYER_FLAGS = ("isGrounded", "isDashing", "canDash", "isAlive", "flip")
+DIRECTIONS = ("left", "right", "up", "down")
+COLLISIONS = ("bottom", "top", "left", "right")
+
+# Packs booleans into a bitfield
+def pack_flags(*values):
+    bits = 0
+    for bit, value in enumerate(values):
+        if value:
+            bits |= 1 << bit
+    return bits
+
+# Writes the whole simulation state into flat buffers and back without pickling
+# Restoring writes into the entities' existing lists and dicts and takes bullets from the pool, previous positions are
+# immutable tuples so those are rebuilt, as every simulation step does
+# Animations are stored as indexes into the sorted animation names so snapshots mean the same in every process
+class SnapshotCodec:
+    def __init__(self, assets):
+        self.assets = assets
+        self.names: list[str] = sorted(set(assets) | set(getattr(assets, "pending", {})))
+        self.index: dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+    # Bytes needed for the simulation's current state
+    def size(self, simulation):
+        bullets = sum(len(player.weapon.bullets) for player in simulation.players if player.weapon is not None)
+        return HEADER.size + PLAYER.size * len(simulation.players) + BULLET.size * bullets
+
+    def animation_index(self, entity):
+        return self.index[entity.tag + "/" + entity.action]
+
+    # Switches an entity to a stored animation and playback position
+    def restore_animation(self, entity, index, frame, time, done):
+        name = self.names[index]
+        action = name[len(entity.tag) + 1:]
+        if action != entity.action:
+            entity.action = action
+            entity.animation.set(self.assets[name])
+        state = entity.animation
+        state.frame = frame
+        state.time_elapsed = time
+        state.done = done
+
+    # Writes the state into a buffer at an offset and returns the offset after it, the buffer must be large enough
+    def save(self, simulation, buffer, offset=0):
+        camera = simulation.camera
+        HEADER.pack_into(buffer, offset, simulation.tick, len(simulation.players), camera.trueScroll[0], camera.trueScroll[1],
+                         camera.prevScroll[0], camera.prevScroll[1], camera.scale, camera.desired_scale)
+        offset += HEADER.size
+        for player in simulation.players:
+            weapon = player.weapon
+            bullets = weapon.bullets if weapon is not None else ()
+            directions = player.directions
+            collisions = player.collisions
+            flags = pack_flags(player.isGrounded, player.isDashing, player.canDash, player.isAlive, player.flip, player.dashCooldown[2],
+                               player.animation.done, *(directions[key] for key in DIRECTIONS), *(collisions[key] for key in COLLISIONS),
+                               weapon is not None and weapon.flip, weapon is not None and weapon.animation.done)
+            if weapon is not None:
+                weaponValues = (weapon.pos[0], weapon.pos[1], weapon.prevPos[0], weapon.prevPos[1], weapon.rotation, weapon.animation.time_elapsed)
+                weaponAnimation = (self.animation_index(weapon), weapon.animation.frame)
+            else:
+                weaponValues = (0, 0, 0, 0, 0, 0)
+                weaponAnimation = (0, 0)
+            PLAYER.pack_into(buffer, offset, player.pos[0], player.pos[1], player.prevPos[0], player.prevPos[1],
+                             player.momentum[0], player.momentum[1], player.airTimer, player.dashCooldown[0], player.dashCooldown[1],
+                             player.animation.time_elapsed, player.cursor.pos[0], player.cursor.pos[1],
+                             player.cursor.location[0], player.cursor.location[1], *weaponValues,
+                             player.health, player.currentJumps, self.animation_index(player), player.animation.frame,
+                             *weaponAnimation, len(bullets), flags)
+            offset += PLAYER.size
+            for bullet in bullets:
+                BULLET.pack_into(buffer, offset, bullet.pos[0], bullet.pos[1], bullet.prevPos[0], bullet.prevPos[1], bullet.rotation,
+                                 bullet.speed, bullet.age, bullet.travelled, bullet.animation.time_elapsed,
+                                 bullet.damage, bullet.animation.frame, pack_flags(bullet.remove, bullet.animation.done))
+                offset += BULLET.size
+        return offset
+
+    # Restores a state written by save into the same simulation in place, bullets are taken from and given back to the pool
+    def restore(self, simulation, buffer, offset=0):
+        tick, count, scrollX, scrollY, prevX, prevY, scale, desiredScale = HEADER.unpack_from(buffer, offset)
+        if count != len(simulation.players):
+            raise ValueError(f"snapshot has {count} players, the simulation has {len(simulation.players)}")
+        offset += HEADER.size
+        simulation.tick = tick
+        camera = simulation.camera
+        camera.trueScroll[0] = scrollX
+        camera.trueScroll[1] = scrollY
+        camera.prevScroll = (prevX, prevY)
+        camera.scale = scale
+        camera.desired_scale = desiredScale
+        renderScale = camera.quantize_scale(scale)
+        if renderScale != camera.renderScale:
+            camera.renderScale = renderScale
+            camera.screen = camera.get_render_target(renderScale)
+
+        for player in simulation.players:
+            (x, y, prevX, prevY, momentumX, momentumY, airTimer, dashTimer, dashMax, animTime, cursorX, cursorY, locationX, locationY,
+             weaponX, weaponY, weaponPrevX, weaponPrevY, rotation, weaponAnimTime,
+             health, jumps, action, frame, weaponAction, weaponFrame, bulletCount, flags) = PLAYER.unpack_from(buffer, offset)
+            offset += PLAYER.size
+            player.pos[0] = x
+            player.pos[1] = y
+            player.rect.x = int(x)
+            player.rect.y = int(y)
+            player.prevPos = (prevX, prevY)
+            player.momentum[0] = momentumX
+            player.momentum[1] = momentumY
+            player.airTimer = airTimer
+            player.dashCooldown[0] = dashTimer
+            player.dashCooldown[1] = dashMax
+            player.dashCooldown[2] = bool(flags & 1 << 5)
+            player.health = health
+            player.currentJumps = jumps
+            for bit, name in enumerate(PLAYER_FLAGS):
+                setattr(player, name, bool(flags & 1 << bit))
+            for bit, key in enumerate(DIRECTIONS, 7):
+                player.directions[key] = bool(flags & 1 << bit)
+            for bit, key in enumerate(COLLISIONS, 11):
+                player.collisions[key] = bool(flags & 1 << bit)
+            if player.world is not None:
+                player.world.top[player.bodyIndex] = player.collisions["top"]
+                player.world.bottom[player.bodyIndex] = player.collisions["bottom"]
+            self.restore_animation(player, action, frame, animTime, bool(flags & 1 << 6))
+            player.cursor.pos[0] = cursorX
+            player.cursor.pos[1] = cursorY
+            player.cursor.location[0] = locationX
+            player.cursor.location[1] = locationY
+
+            weapon = player.weapon
+            if weapon is None:
+                continue
+            weapon.pos[0] = weaponX
+            weapon.pos[1] = weaponY
+            weapon.prevPos = (weaponPrevX, weaponPrevY)
+            weapon.rotation = rotation
+            weapon.flip = bool(flags & 1 << 15)
+            self.restore_animation(weapon, weaponAction, weaponFrame, weaponAnimTime, bool(flags & 1 << 16))
+
+            # Bullets are matched up by position in the list, the pool covers any difference in count
+            bullets = weapon.bullets
+            pool = weapon.pool
+            while len(bullets) > bulletCount:
+                pool.release(bullets.pop())
+            while len(bullets) < bulletCount:
+                bullets.append(pool.acquire((0, 0), (0, 0), 0, 0, 0))
+            for bullet in bullets:
+                (x, y, prevX, prevY, rotation, speed, age, travelled, animTime, damage, frame, bulletFlags) = BULLET.unpack_from(buffer, offset)
+                offset += BULLET.size
+                bullet.pos[0] = x
+                bullet.pos[1] = y
+                bullet.rect.x = int(x)
+                bullet.rect.y = int(y)
+                bullet.prevPos = (prevX, prevY)
+                if rotation != bullet.rotation:
+                    bullet.rotation = rotation
+                    bullet.rotatedFrom = None
+                bullet.speed = speed
+                bullet.age = age
+                bullet.travelled = travelled
+                bullet.damage = damage
+                bullet.remove = bool(bulletFlags & 1)
+                state = bullet.animation
+                state.frame = frame
+                state.time_elapsed = animTime
+                state.done = bool(bulletFlags & 2)
+        return offset
+
+# Ring of the last few snapshots of a simulation, buffers are allocated once and only grow when the state outgrows them
+class SnapshotRing:
+    def __init__(self, simulation, length=8, capacity=16384, codec=None):
+        self.simulation = simulation
+        self.codec: SnapshotCodec = codec if codec is not None else SnapshotCodec(simulation.assets)
+        self.length: int = length
+        self.buffers: list[bytearray] = [bytearray(capacity) for _ in range(length)]
+        self.ticks: list[int] = [-1] * length # tick held by each slot
+        self.sizes: list[int] = [0] * length
+
+    def __contains__(self, tick):
+        return self.ticks[tick % self.length] == tick
+
+    # Snapshots the current tick, overwriting the oldest one
+    def save(self):
+        simulation = self.simulation
+        slot = simulation.tick % self.length
+        size = self.codec.size(simulation)
+        if size > len(self.buffers[slot]):
+            self.buffers[slot] = bytearray(max(size, len(self.buffers[slot]) * 2))
+        self.sizes[slot] = self.codec.save(simulation, self.buffers[slot])
+        self.ticks[slot] = simulation.tick
+
+    # Rewinds the simulation to a tick still held by the ring
+    def restore(self, tick):
+        slot = tick % self.length
+        if self.ticks[slot] != tick:
+            raise KeyError(f"tick {tick} is no longer in the snapshot ring")
+        self.codec.restore(self.simulation, self.buffers[slot])
+
+    # Returns the bytes of a held snapshot
+    def view(self, tick):
+        slot = tick % self.length
+        if self.ticks[slot] != tick:
+            raise KeyError(f"tick {tick} is no longer in the snapshot ring")
+        return memoryview(self.buffers[slot])[:self.sizes[slot]]
@@ -0,0 +1,108 @@
+# Uniform grid used as a broadphase for rect collisions
+class SpatialHash:
+    def __init__(self, cellSize=64):
+        self.cellSize = cellSize
+        self.cells: dict[tuple[int, int], dict[int, object]] = {}
+        self.entries: dict[int, list] = {} # id(obj) -> [obj, rect, cells, order]
+        self.counter = 0
+
+    # Builds a spatial hash from a list of static rects
+    @staticmethod
+    def from_rects(rects, cellSize=64):
+        spatialHash = SpatialHash(cellSize)
+        for rect in rects:
+            spatialHash.insert(rect)
+        return spatialHash
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for entry in sorted(self.entries.values(), key=lambda entry: entry[3]):
+            yield entry[0]
+
+    def __contains__(self, obj):
+        return id(obj) in self.entries
+
+    # Returns the grid cells a rect covers
+    def cells_for_rect(self, rect):
+        size = self.cellSize
+        x1 = rect.left // size
+        y1 = rect.top // size
+        x2 = (rect.right - 1) // size if rect.width > 0 else x1
+        y2 = (rect.bottom - 1) // size if rect.height > 0 else y1
+        return [(x, y) for x in range(x1, x2 + 1) for y in range(y1, y2 + 1)]
+
+    # Adds an object, the rect defaults to the object itself
+    def insert(self, obj, rect=None):
+        if rect is None:
+            rect = obj
+        key = id(obj)
+        if key in self.entries:
+            self.update(obj)
+            return
+        cells = self.cells_for_rect(rect)
+        self.entries[key] = [obj, rect, cells, self.counter]
+        self.counter += 1
+        for cell in cells:
+            self.cells.setdefault(cell, {})[key] = obj
+
+    # Removes an object
+    def remove(self, obj):
+        key = id(obj)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for cell in entry[2]:
+            bucket = self.cells[cell]
+            del bucket[key]
+            if not bucket:
+                del self.cells[cell]
+
+    # Re-buckets an object after its rect has changed, a new rect can be passed in
+    def update(self, obj, rect=None):
+        key = id(obj)
+        entry = self.entries[key]
+        if rect is not None:
+            entry[1] = rect
+        cells = self.cells_for_rect(entry[1])
+        if cells == entry[2]:
+            return
+        for cell in entry[2]:
+            bucket = self.cells[cell]
+            del bucket[key]
+            if not bucket:
+                del self.cells[cell]
+        for cell in cells:
+            self.cells.setdefault(cell, {})[key] = obj
+        entry[2] = cells
+
+    # Moves an object's rect to a position and re-buckets it
+    def move(self, obj, pos):
+        rect = self.entries[id(obj)][1]
+        rect.x = pos[0]
+        rect.y = pos[1]
+        self.update(obj)
+
+    # Returns every object in the cells a rect touches, in insertion order
+    def candidates(self, rect):
+        found = {}
+        for cell in self.cells_for_rect(rect):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        if len(found) > 1:
+            entries = self.entries
+            return sorted(found.values(), key=lambda obj: entries[id(obj)][3])
+        return list(found.values())
+
+    # Returns every object whose rect collides with the rect
+    def query(self, rect):
+        entries = self.entries
+        return [obj for obj in self.candidates(rect) if entries[id(obj)][1].colliderect(rect)]
+
+    # Removes everything from the grid
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+        self.counter = 0
@@ -0,0 +1,151 @@
+# Modules
+import pygame
+
+# Scripts
+from scripts.camera import CameraObject
+
+# Static geometry baked into fixed-size chunk surfaces, only the chunks in view are drawn each frame
+class StaticLayer:
+    def __init__(self, chunkSize=256, layer=0, colorkey=(255, 0, 255)):
+        self.chunkSize: int = chunkSize
+        self.layer: int = layer
+        self.colorkey = colorkey
+        self.items: dict[tuple[int, int], list[tuple]] = {} # chunk -> [(rect or surface, colour or pos)]
+        self.chunks: dict[tuple[int, int], pygame.Surface] = {} # baked chunk surfaces
+        self.dirty: set[tuple[int, int]] = set()
+        # Tiles
+        self.tilemap = None
+        self.tileImages: dict[str, pygame.Surface] = {}
+        self.tileColour = (255, 255, 255)
+        # Stats
+        self.bakes: int = 0
+
+    # Builds a static layer from a tilemap, tiles without an image are drawn as filled rects
+    @staticmethod
+    def from_tilemap(tilemap, tileImages=None, tileColour=(255, 255, 255), chunkSize=256, layer=0):
+        staticLayer = StaticLayer(chunkSize, layer)
+        staticLayer.tilemap = tilemap
+        staticLayer.tileImages = tileImages or {}
+        staticLayer.tileColour = tileColour
+        size = tilemap.size
+        for key in staticLayer.chunks_for_rect(pygame.Rect(0, 0, size[0], size[1])):
+            staticLayer.dirty.add(key)
+        return staticLayer
+
+    # Returns the chunks a world rect overlaps
+    def chunks_for_rect(self, rect):
+        size = self.chunkSize
+        x1 = rect.left // size
+        y1 = rect.top // size
+        x2 = (rect.right - 1) // size
+        y2 = (rect.bottom - 1) // size
+        return [(x, y) for x in range(x1, x2 + 1) for y in range(y1, y2 + 1)]
+
+    # Adds a filled rect
+    def add_rect(self, rect, colour=(255, 255, 255)):
+        for key in self.chunks_for_rect(rect):
+            self.items.setdefault(key, []).append((rect, colour))
+            self.dirty.add(key)
+
+    # Adds a surface at a world position
+    def add_surface(self, surface, pos):
+        rect = surface.get_rect(topleft=pos)
+        for key in self.chunks_for_rect(rect):
+            self.items.setdefault(key, []).append((surface, (rect.x, rect.y)))
+            self.dirty.add(key)
+
+    # Removes a rect or surface added earlier
+    def remove(self, item):
+        for key, items in self.items.items():
+            count = len(items)
+            items[:] = [entry for entry in items if entry[0] is not item]
+            if len(items) != count:
+                self.dirty.add(key)
+
+    # Changes a tile of the tilemap, only the chunk holding it is re-baked, the map grows to fit tiles past its edges
+    # tiles: collision index built from the tilemap's rects, it is updated with them, without it the edit is only visual
+    def set_tile(self, x, y, value, tiles=None):
+        removed, added = self.tilemap.set_tile(x, y, value)
+        if tiles is not None:
+            for rect in removed:
+                tiles.remove(rect)
+            for rect in added:
+                tiles.insert(rect)
+        size = self.tilemap.tileSize
+        for key in self.chunks_for_rect(pygame.Rect(x * size, y * size, size, size)):
+            self.dirty.add(key)
+
+    # Marks the chunks overlapping a world rect for re-baking
+    def invalidate(self, rect):
+        for key in self.chunks_for_rect(rect):
+            self.dirty.add(key)
+
+    # Draws everything in a chunk onto its surface
+    def bake_chunk(self, key):
+        size = self.chunkSize
+        offsetX = key[0] * size
+        offsetY = key[1] * size
+        surf = self.chunks.get(key)
+        if surf is None:
+            surf = pygame.Surface((size, size))
+            if pygame.display.get_surface() is not None:
+                surf = surf.convert()
+            surf.set_colorkey(self.colorkey)
+        surf.fill(self.colorkey)
+        empty = True
+
+        if self.tilemap is not None:
+            tileSize = self.tilemap.tileSize
+            grid = self.tilemap.grid
+            emptyTiles = self.tilemap.empty
+            x1 = offsetX // tileSize
+            y1 = offsetY // tileSize
+            x2 = min((offsetX + size - 1) // tileSize + 1, self.tilemap.columns)
+            y2 = min((offsetY + size - 1) // tileSize + 1, self.tilemap.rows)
+            for y in range(max(y1, 0), y2):
+                row = grid[y]
+                for x in range(max(x1, 0), min(x2, len(row))):
+                    tile = row[x]
+                    if tile in emptyTiles:
+                        continue
+                    pos = (x * tileSize - offsetX, y * tileSize - offsetY)
+                    image = self.tileImages.get(tile)
+                    if image is not None:
+                        surf.blit(image, pos)
+                    else:
+                        pygame.draw.rect(surf, self.tileColour, (pos[0], pos[1], tileSize, tileSize))
+                    empty = False
+
+        for entity, extra in self.items.get(key, ()):
+            if isinstance(entity, pygame.Rect):
+                pygame.draw.rect(surf, extra, entity.move(-offsetX, -offsetY))
+            else:
+                surf.blit(entity, (extra[0] - offsetX, extra[1] - offsetY))
+            empty = False
+
+        # Empty chunks are dropped so they cost nothing to draw
+        if empty:
+            self.chunks.pop(key, None)
+        else:
+            self.chunks[key] = surf
+        self.bakes += 1
+
+    # Bakes every chunk that has changed
+    def bake(self):
+        for key in self.dirty:
+            self.bake_chunk(key)
+        self.dirty.clear()
+
+    # Returns camera objects for the chunks overlapping the camera's view, dirty chunks are baked when they come into view
+    def camera_objects(self, camera):
+        size = self.chunkSize
+        view = pygame.Rect(camera.scroll[0] - 1, camera.scroll[1] - 1, camera.screenSize[0] + 2, camera.screenSize[1] + 2)
+        cameraObjects = []
+        for key in self.chunks_for_rect(view):
+            if key in self.dirty:
+                self.bake_chunk(key)
+                self.dirty.discard(key)
+            surf = self.chunks.get(key)
+            if surf is not None:
+                cameraObjects.append(CameraObject(surf, (key[0] * size, key[1] * size), self.layer))
+        return cameraObjects
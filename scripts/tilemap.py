@@ -0,0 +1,196 @@
+# Modules
+import pygame, os, struct, hashlib, zlib
+from array import array
+
+# Scripts
+from scripts.framework import load_map
+from scripts.spatial import SpatialHash
+
+CACHE_MAGIC = b"TMAP"
+CACHE_VERSION = 1
+# magic, version, csv mtime, csv size, csv sha1, params crc, tile size, columns, rows, strings, rects
+CACHE_HEADER = struct.Struct("<4sHqQ20sIHIIII")
+
+# A grid of tiles and the merged rects used for collisions
+class Tilemap:
+    def __init__(self, grid, tileSize=16, empty=("-1", ""), rects=None):
+        self.grid: list[list[str]] = grid
+        self.tileSize: int = tileSize
+        self.empty: tuple[str] = tuple(empty)
+        self.rows: int = len(grid)
+        self.columns: int = max((len(row) for row in grid), default=0)
+        self.rects: list[pygame.Rect] = rects if rects is not None else merge_solid_tiles(grid, tileSize, self.empty)
+
+    # Returns the size of the map in pixels
+    @property
+    def size(self):
+        return self.columns * self.tileSize, self.rows * self.tileSize
+
+    # Returns the tile value at a grid position
+    def get_tile(self, x, y):
+        if 0 <= y < self.rows and 0 <= x < len(self.grid[y]):
+            return self.grid[y][x]
+        return self.empty[0]
+
+    # Checks if a grid position holds a solid tile
+    def is_solid(self, x, y):
+        return self.get_tile(x, y) not in self.empty
+
+    # Changes a tile, growing the grid to fit it, and re-merges the collision rects when the tile's solidity changes
+    # Returns the rects taken out of and added to rects, unchanged rects keep their objects so a collision index can follow
+    def set_tile(self, x, y, value):
+        if x < 0 or y < 0:
+            raise ValueError(f"tile ({x}, {y}) is outside the map, grid positions can't be negative")
+        while len(self.grid) <= y:
+            self.grid.append([])
+        row = self.grid[y]
+        while len(row) <= x:
+            row.append(self.empty[0])
+        wasSolid = row[x] not in self.empty
+        row[x] = value
+        self.rows = len(self.grid)
+        self.columns = max(self.columns, len(row))
+        if wasSolid == (value not in self.empty):
+            return [], []
+
+        merged = {tuple(rect): rect for rect in merge_solid_tiles(self.grid, self.tileSize, self.empty)}
+        current = {tuple(rect): rect for rect in self.rects}
+        removed = [rect for key, rect in current.items() if key not in merged]
+        added = [rect for key, rect in merged.items() if key not in current]
+        self.rects = [current.get(key, rect) for key, rect in merged.items()]
+        return removed, added
+
+    # Returns a spatial hash of the merged collision rects
+    def collision_index(self, cellSize=None):
+        if cellSize is None:
+            cellSize = self.tileSize * 8
+        return SpatialHash.from_rects(self.rects, cellSize)
+
+# Greedily merges solid tiles into rects, first into horizontal runs then down into matching runs
+def merge_solid_tiles(grid, tileSize, empty=("-1", "")):
+    rects = []
+    open_runs = {} # (start, end) -> rect still being extended downwards
+    for y, row in enumerate(grid):
+        runs = []
+        x = 0
+        while x < len(row):
+            if row[x] in empty:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x] not in empty:
+                x += 1
+            runs.append((start, x))
+
+        next_runs = {}
+        for run in runs:
+            rect = open_runs.pop(run, None)
+            if rect is not None:
+                rect.height += tileSize
+            else:
+                rect = pygame.Rect(run[0] * tileSize, y * tileSize, (run[1] - run[0]) * tileSize, tileSize)
+                rects.append(rect)
+            next_runs[run] = rect
+        open_runs = next_runs
+    return rects
+
+# Returns the path of the cache file for a map
+def cache_path(filename):
+    return filename + ".cache"
+
+# Returns a checksum of the settings that change the merged rects
+def params_checksum(tileSize, empty):
+    return zlib.crc32(repr((tileSize, sorted(empty))).encode())
+
+# Writes a tilemap to a binary cache file
+def save_cache(filename, tilemap, stat, digest):
+    strings = sorted({tile for row in tilemap.grid for tile in row})
+    lookup = {tile: index for index, tile in enumerate(strings)}
+    if len(strings) > 0xFFFF:
+        return
+    emptyIndex = len(strings)
+
+    cells = array("H", [emptyIndex]) * (tilemap.rows * tilemap.columns)
+    for y, row in enumerate(tilemap.grid):
+        offset = y * tilemap.columns
+        for x, tile in enumerate(row):
+            cells[offset + x] = lookup[tile]
+    rowLengths = array("I", [len(row) for row in tilemap.grid])
+    rects = array("i")
+    for rect in tilemap.rects:
+        rects.extend((rect.x, rect.y, rect.width, rect.height))
+
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest,
+                               params_checksum(tilemap.tileSize, tilemap.empty), tilemap.tileSize,
+                               tilemap.columns, tilemap.rows, len(strings), len(tilemap.rects))
+    table = b"".join(struct.pack("<H", len(encoded)) + encoded for encoded in (tile.encode() for tile in strings))
+    try:
+        with open(cache_path(filename), "wb") as file:
+            file.write(header + table + rowLengths.tobytes() + cells.tobytes() + rects.tobytes())
+    except OSError as e:
+        print(f"Error while saving map cache: {e}")
+
+# Reads a tilemap from a binary cache file, returns None if it is missing or stale
+def load_cache(filename, tileSize, empty, stat, contents=None):
+    try:
+        with open(cache_path(filename), "rb") as file:
+            data = file.read()
+    except OSError:
+        return None
+    if len(data) < CACHE_HEADER.size:
+        return None
+
+    magic, version, mtime, size, digest, params, cachedTileSize, columns, rows, stringCount, rectCount = CACHE_HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION or params != params_checksum(tileSize, empty):
+        return None
+    # Trust the modification time, falling back to the hash if the file was only touched
+    if (mtime, size) != (stat.st_mtime_ns, stat.st_size):
+        if contents is None or hashlib.sha1(contents).digest() != digest:
+            return None
+
+    offset = CACHE_HEADER.size
+    strings = []
+    for _ in range(stringCount):
+        length = struct.unpack_from("<H", data, offset)[0]
+        offset += 2
+        strings.append(data[offset:offset + length].decode())
+        offset += length
+
+    rowLengths = array("I")
+    rowLengths.frombytes(data[offset:offset + rows * rowLengths.itemsize])
+    offset += rows * rowLengths.itemsize
+    cells = array("H")
+    cells.frombytes(data[offset:offset + rows * columns * cells.itemsize])
+    offset += rows * columns * cells.itemsize
+    values = array("i")
+    values.frombytes(data[offset:offset + rectCount * 4 * values.itemsize])
+
+    grid = []
+    for y in range(rows):
+        start = y * columns
+        grid.append([strings[index] for index in cells[start:start + rowLengths[y]]])
+    rects = [pygame.Rect(values[i], values[i + 1], values[i + 2], values[i + 3]) for i in range(0, len(values), 4)]
+    return Tilemap(grid, cachedTileSize, empty, rects)
+
+# Loads a .csv map into a tilemap, using the binary cache when the file has not changed
+def load_tilemap(filename, tileSize=16, empty=("-1", ""), cache=True):
+    empty = tuple(empty)
+    if not cache:
+        return Tilemap(load_map(filename), tileSize, empty)
+
+    stat = os.stat(filename)
+    tilemap = load_cache(filename, tileSize, empty, stat)
+    if tilemap is not None:
+        return tilemap
+
+    with open(filename, "rb") as file:
+        contents = file.read()
+    tilemap = load_cache(filename, tileSize, empty, stat, contents)
+    if tilemap is not None:
+        # Refresh the stored modification time so the next load skips hashing
+        save_cache(filename, tilemap, stat, hashlib.sha1(contents).digest())
+        return tilemap
+
+    tilemap = Tilemap(load_map(filename), tileSize, empty)
+    save_cache(filename, tilemap, stat, hashlib.sha1(contents).digest())
+    return tilemap
@@ -0,0 +1,37 @@
+# Rate the movement rules were tuned at, the simulation's dt is measured in ticks of this rate
+TICK_RATE = 120
+
+# Fixed timestep accumulator, the simulation advances in equal steps however fast frames are rendered
+class FixedTimestep:
+    def __init__(self, rate=60, maxSteps=5, tickRate=TICK_RATE):
+        self.rate: float = rate
+        self.step: float = 1 / rate # seconds per step
+        self.dt: float = tickRate / rate # dt handed to the simulation each step
+        self.maxSteps: int = maxSteps # catch-up steps allowed per frame
+        self.accumulator: float = 0
+        # Stats
+        self.steps: int = 0
+        self.dropped: float = 0 # seconds of simulation skipped to stay within maxSteps
+
+    # Adds the time a frame took and returns how many steps to simulate
+    def advance(self, elapsed):
+        self.accumulator += elapsed
+        steps = int(self.accumulator / self.step)
+        # Slow machines drop the time they can't catch up on instead of spiralling
+        if steps > self.maxSteps:
+            self.dropped += (steps - self.maxSteps) * self.step
+            steps = self.maxSteps
+            self.accumulator = self.step * steps + self.accumulator % self.step
+        self.accumulator -= steps * self.step
+        self.steps += steps
+        return steps
+
+    # How far rendering is between the last two simulated states, from 0 to 1
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.step, 1)
+
+    # Forgets accumulated time, used after pauses so the simulation doesn't rush to catch up
+    def reset(self):
+        self.accumulator = 0
+
@@ -4,19 +4,25 @@ import pygame, math
 # Scripts
 from scripts.entities import Entity
 from scripts.camera import CameraObject
-from scripts.framework import get_center, blit_rotate
+from scripts.framework import get_center, blit_rotate, collision_test
+from scripts.rotation import rotation_cache
 
+# projectiles: expires bullets and hands them back to its pool, weapons can share one
 class Weapon(Entity):
-    def __init__(self, pos, size, tag, assets, pivot=(0, 0), offset=0):
+    def __init__(self, pos, size, tag, assets, pivot=(0, 0), offset=0, projectiles=None):
         super().__init__(pos, size, tag, assets)
         self.pivot = pivot
         self.offset = offset
         self.rotation = 0
         self.bullets = []
+        self.bulletSpeed: float = 5
+        self.bulletDamage: int = 30
+        self.projectiles: ProjectileManager = projectiles if projectiles is not None else ProjectileManager(BulletPool(assets))
+        self.pool: BulletPool = self.projectiles.pool
 
     # Shoots a bullet in the direction of the mouse cursor
     def shoot(self, cursor):
-        bullet = Bullet(self.pos, cursor.pos, (5, 5), "bullet1", self.assets, self.rotation, 5, 30)
+        bullet = self.pool.acquire(self.pos, cursor.pos, self.rotation, self.bulletSpeed, self.bulletDamage)
         self.bullets.append(bullet)
 
     def rotate_at_cursor(self, cursor, camera):
@@ -32,49 +38,88 @@ class Weapon(Entity):
 
         self.rotation = self.get_point_angle((cursor.location[0], cursor.location[1]), camera.scroll, self.offset, False)
         
-    def update(self, entity, camera):
+    # Moves the weapon with its entity and updates its bullets, tiles can be a list or a SpatialHash
+    def update(self, entity, camera, dt=1, tiles=None):
         self.pos = get_center(entity.pos, entity.size)
         self.rotate_at_cursor(entity.cursor, camera)
+        self.projectiles.update(self.bullets, dt, tiles)
 
+    # Remembers the positions of the weapon and its bullets before a simulation step
+    def store_previous(self):
+        super().store_previous()
         for bullet in self.bullets:
-            bullet.update()
-            self.check_bullets()
+            bullet.store_previous()
 
-    def render(self):
-        img = blit_rotate(self.current_image, self.pos, self.pivot, self.rotation)
+    def render(self, alpha=1.0):
+        img = blit_rotate(self.current_image, self.render_pos(alpha), self.pivot, self.rotation)
         weaponCameraObject = CameraObject(img[0], (img[1].x, img[1].y), 2)
         cameraObjects = [weaponCameraObject]
         
         for bullet in self.bullets:
-            cameraObjects.append(bullet.render())
+            if not bullet.remove:
+                cameraObjects.append(bullet.render(alpha))
 
         return cameraObjects
-    
-    def check_bullets(self):
-        for bullet in self.bullets:
-            if bullet.remove:
-                self.bullets.remove(bullet)
 
 class Bullet(Entity):
     def __init__(self, pos, targetPos, size, tag, assets, rotation, speed, damage, rotationOffset=-90):
         super().__init__(pos, size, tag, assets)
-        self.pos = pos
+        # Bullets own their position so a pooled bullet can be reset in place
+        self.pos = [pos[0], pos[1]]
         self.targetPos = targetPos
         self.rotation = rotation
         self.rotationOffset = rotationOffset
         self.speed = speed
         self.damage = damage
         self.remove = False
+        # Lifetime
+        self.age: float = 0 # ticks since it was fired
+        self.travelled: float = 0
+        # Rotation never changes after spawning, so the rotated frame is kept until the frame changes
+        self.rotatedFrom = None
+        self.rotatedImage = None
 
-    def update(self):
-        dx = math.cos(math.radians(self.rotation + self.rotationOffset)) * self.speed
-        dy = -math.sin(math.radians(self.rotation + self.rotationOffset)) * self.speed
+    # Reuses a released bullet for a new shot without allocating
+    def reset(self, pos, targetPos, rotation, speed, damage):
+        self.pos[0] = pos[0]
+        self.pos[1] = pos[1]
+        self.prevPos = (pos[0], pos[1])
+        self.rect.x = int(pos[0])
+        self.rect.y = int(pos[1])
+        self.targetPos = targetPos
+        self.speed = speed
+        self.damage = damage
+        self.remove = False
+        self.age = 0
+        self.travelled = 0
+        if rotation != self.rotation:
+            self.rotation = rotation
+            self.rotatedFrom = None
+        self.animation.set(self.animation.data)
+
+    def update(self, dt=1):
+        dx = math.cos(math.radians(self.rotation + self.rotationOffset)) * self.speed * dt
+        dy = -math.sin(math.radians(self.rotation + self.rotationOffset)) * self.speed * dt
         self.pos[0] += dx
         self.pos[1] += dy
+        self.rect.x = int(self.pos[0])
+        self.rect.y = int(self.pos[1])
+        self.age += dt
+        self.travelled += self.speed * dt
+
+    # Hit mask of the rotated frame the bullet is drawn with, it shares the rendered top left so mask_collide lines up
+    @property
+    def current_mask(self):
+        return rotation_cache.mask(self.current_image, self.rotation)
 
-    def render(self):
-        img = pygame.transform.rotate(self.current_image, self.rotation)
-        return CameraObject(img, (self.pos[0] + self.anim_offset[0], self.pos[1] + self.anim_offset[1]), 1)
+    def render(self, alpha=1.0):
+        frame = self.current_image
+        if frame is not self.rotatedFrom:
+            self.rotatedFrom = frame
+            self.rotatedImage = rotation_cache.get(frame, self.rotation)
+        img = self.rotatedImage
+        x, y = self.render_pos(alpha)
+        return CameraObject(img, (x + self.anim_offset[0], y + self.anim_offset[1]), 1)
     
     # Checks for collisions on an entity, it can take a colliding function which runs when a collision occurs, and a checking function
     def check_collision_on_entity(self, entity, collidedFunc, checkingFunc=None):
@@ -84,4 +129,101 @@ class Bullet(Entity):
         else:
             if self.rect.colliderect(entity.rect):
                 collidedFunc(entity)
-            
\ No newline at end of file
+            
+# Preallocated bullets handed out by acquire and taken back by release, the pool grows when it runs out
+class BulletPool:
+    def __init__(self, assets, tag="bullet1", size=(5, 5), capacity=0):
+        self.assets = assets
+        self.tag = tag
+        self.size = size
+        self.free: list[Bullet] = []
+        # Counters
+        self.allocated: int = 0 # bullets constructed
+        self.acquired: int = 0
+        self.released: int = 0
+        self.reserve(capacity)
+
+    def __len__(self):
+        return len(self.free)
+
+    # Bullets currently in flight
+    @property
+    def live(self):
+        return self.acquired - self.released
+
+    # Constructs bullets until at least count are free
+    def reserve(self, count):
+        while len(self.free) < count:
+            self.free.append(self.allocate())
+
+    def allocate(self):
+        self.allocated += 1
+        return Bullet((0, 0), (0, 0), self.size, self.tag, self.assets, 0, 0, 0)
+
+    # Returns a bullet set up for a new shot
+    def acquire(self, pos, targetPos, rotation, speed, damage):
+        bullet = self.free.pop() if self.free else self.allocate()
+        bullet.reset(pos, targetPos, rotation, speed, damage)
+        self.acquired += 1
+        return bullet
+
+    # Gives a bullet back once it is no longer in any weapon's list
+    def release(self, bullet):
+        bullet.remove = True
+        self.free.append(bullet)
+        self.released += 1
+
+    # Returns the pool counters
+    def stats(self):
+        return {"allocated": self.allocated, "free": len(self.free), "live": self.live, "acquired": self.acquired, "released": self.released}
+
+# Moves bullets and expires them by lifetime, range, world bounds and tile hits
+# Expired and hit bullets are compacted out of a weapon's list in the same pass and go back to the pool
+class ProjectileManager:
+    def __init__(self, pool, bounds=None, maxLifetime=360, maxRange=None):
+        self.pool: BulletPool = pool
+        self.bounds: pygame.Rect = bounds # bullets leaving it expire, None for no bounds
+        self.maxLifetime: float = maxLifetime # ticks, None for no limit
+        self.maxRange: float = maxRange # distance, None for no limit
+        # Stats
+        self.expired: dict[str, int] = {"hit": 0, "lifetime": 0, "range": 0, "bounds": 0, "tiles": 0}
+
+    # Bullets in flight across every weapon using this manager's pool
+    @property
+    def live(self):
+        return self.pool.live
+
+    # Returns why a bullet should expire, or None if it is still flying
+    def expiry(self, bullet, tiles):
+        if self.maxLifetime is not None and bullet.age >= self.maxLifetime:
+            return "lifetime"
+        if self.maxRange is not None and bullet.travelled >= self.maxRange:
+            return "range"
+        if self.bounds is not None and not self.bounds.colliderect(bullet.rect):
+            return "bounds"
+        if tiles is not None and collision_test(bullet.rect, tiles):
+            return "tiles"
+        return None
+
+    # Updates a list of bullets in place, keeping the order of the ones still flying
+    def update(self, bullets, dt=1, tiles=None):
+        pool = self.pool
+        expired = self.expired
+        kept = 0
+        for bullet in bullets:
+            if bullet.remove:
+                reason = "hit"
+            else:
+                bullet.update(dt)
+                reason = self.expiry(bullet, tiles)
+            if reason is not None:
+                expired[reason] += 1
+                pool.release(bullet)
+                continue
+            bullets[kept] = bullet
+            kept += 1
+        del bullets[kept:]
+
+    # Returns the live count and why bullets have expired
+    def stats(self):
+        return {"live": self.live, **self.expired}
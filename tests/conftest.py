@@ -0,0 +1,13 @@
+# Modules
+import pygame, pytest
+
+# Scripts
+from scripts.framework import init_headless
+from scripts.animation import load_animations
+
+# Animations shared by every test, loaded once without a display
+@pytest.fixture(scope="session")
+def assets():
+    init_headless()
+    pygame.init()
+    return load_animations("data/images/")
@@ -0,0 +1,40 @@
+# Modules
+import pygame, os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# Scripts
+from scripts.animation import load_animations
+from scripts.camera import Camera
+from scripts.input import Keyboard
+from scripts.settings import Settings, DEFAULT_RESOLUTION
+from scripts.simulation import Simulation
+from scripts.weapons import Weapon
+
+def create_simulation(assets):
+    simulation = Simulation(assets, Camera(DEFAULT_RESOLUTION, 2, headless=True))
+    device = Keyboard(Settings(headless=True).keyboard)
+    device.live = False
+    simulation.create_player([0, 0], Weapon([0, 0], [8, 8], "gun", assets, (4, -3), 90, simulation.projectiles), device)
+    return simulation
+
+# Stepping one simulation leaves the animations of another where they were
+def test_simulations_animate_independently():
+    pygame.init()
+    assets = load_animations("data/images/")
+    first = create_simulation(assets)
+    second = create_simulation(assets)
+    state = first.players[0].animation
+    before = (state.frame, state.time_elapsed)
+    for _ in range(50):
+        second.update(2)
+    assert (state.frame, state.time_elapsed) == before
+    assert second.players[0].animation.frame != 0 or second.players[0].animation.time_elapsed != 0
+
+# Removed players stop being animated
+def test_removed_player_is_not_animated():
+    pygame.init()
+    simulation = create_simulation(load_animations("data/images/"))
+    player = simulation.players[0]
+    simulation.remove_player(player)
+    assert player.animation not in simulation.animated
@@ -0,0 +1,52 @@
+# Modules
+import pygame, random
+
+# Scripts
+from scripts.entities import PhysicsEntity
+from scripts.spatial import SpatialHash
+from scripts.camera import Camera
+from scripts.input import Keyboard, BUTTONS
+from scripts.settings import Settings, DEFAULT_RESOLUTION
+from scripts.simulation import Simulation
+from scripts.weapons import Weapon
+
+# Runs four players on random input and returns every player's movement state after each step
+def run_players(assets, vectorised, steps=600, seed=5):
+    rng = random.Random(seed)
+    simulation = Simulation(assets, Camera(DEFAULT_RESOLUTION, 2, headless=True), vectorised, verbose=False)
+    controls = Settings(headless=True).keyboard
+    for i in range(4):
+        device = Keyboard(controls)
+        device.live = False
+        simulation.create_player([i * 30, 0], Weapon([0, 0], [8, 8], "gun", assets, (4, -3), 90, simulation.projectiles), device)
+    buttons = [1 << BUTTONS.index(name) for name in ("moveR", "moveL", "dash", "jump", "shoot")]
+    states = []
+    for _ in range(steps):
+        for device in simulation.devices:
+            if rng.random() < 0.1:
+                device.press(rng.choice(buttons))
+            if rng.random() < 0.1:
+                device.release(rng.choice(buttons))
+        simulation.update(2)
+        states.append([(float(player.pos[0]), float(player.pos[1]), float(player.momentum[0]), float(player.momentum[1]),
+                        float(player.airTimer), player.isDashing, player.flip, player.currentJumps) for player in simulation.players])
+    return states
+
+# The vectorised PhysicsWorld step moves players exactly like update_momentum one player at a time
+def test_world_step_matches_per_object_update(assets):
+    assert run_players(assets, True) == run_players(assets, False)
+
+# A move far larger than a wall is thick stops against it instead of passing through
+def test_fast_move_stops_at_thin_wall(assets):
+    entity = PhysicsEntity([60, 50], [8, 13], "player", assets)
+    entity.move([500, 0], SpatialHash.from_rects([pygame.Rect(100, 0, 2, 200)]), 1)
+    assert entity.rect.right == 100
+    assert entity.pos[0] == 92
+    assert entity.collisions["right"]
+
+# Falling onto a thin floor lands on top of it
+def test_fast_fall_lands_on_thin_floor(assets):
+    entity = PhysicsEntity([60, 50], [8, 13], "player", assets)
+    entity.move([0, 500], [pygame.Rect(0, 200, 200, 2)], 1)
+    assert entity.rect.bottom == 200
+    assert entity.collisions["bottom"]
@@ -0,0 +1,54 @@
+# Modules
+import pygame, random, os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# Scripts
+from scripts.animation import load_animations
+from scripts.camera import Camera
+from scripts.input import Keyboard
+from scripts.replay import ReplayRecorder, load_replay, state_digest
+from scripts.settings import Settings, DEFAULT_RESOLUTION
+from scripts.simulation import Simulation
+from scripts.timestep import TICK_RATE
+from scripts.weapons import Weapon
+
+# Builds a simulation with two players sharing one keyboard, the default setup without controllers
+def shared_keyboard_simulation(assets, device):
+    simulation = Simulation(assets, Camera(DEFAULT_RESOLUTION, 2, headless=True))
+    simulation.camera.set_targets(simulation.players, (0, -50))
+    simulation.camera.toggle_panning()
+    for x in (0, 40):
+        simulation.create_player([x, 0], Weapon([0, 0], [8, 8], "gun", assets, (4, -3), 90, simulation.projectiles), device)
+    return simulation
+
+# A shared live device is polled once per step, so replaying the recording ends in the same state
+def test_shared_device_replays(tmp_path, monkeypatch):
+    pygame.init()
+    assets = load_animations("data/images/")
+    settings = Settings(headless=True)
+    rng = random.Random(3)
+    monkeypatch.setattr(pygame.mouse, "get_pos", lambda: (rng.randint(0, 1279), rng.randint(0, 719)))
+    dt = TICK_RATE / 60
+
+    device = Keyboard(settings.keyboard)
+    simulation = shared_keyboard_simulation(assets, device)
+    simulation.recorder = ReplayRecorder(dt, DEFAULT_RESOLUTION)
+    for _ in range(300):
+        if rng.random() < 0.1:
+            device.press(1 << rng.randrange(6))
+        if rng.random() < 0.1:
+            device.release(1 << rng.randrange(6))
+        simulation.update(dt)
+    path = tmp_path / "shared.replay"
+    simulation.recorder.save(path, state_digest(simulation))
+
+    replay = load_replay(path)
+    devices = replay.create_devices(settings)
+    assert len(devices) == 1
+    replayed = shared_keyboard_simulation(assets, devices[0])
+    replayed.replay = replay
+    while not replay.finished:
+        replayed.update(dt)
+    assert [list(player.cursor.pos) for player in replayed.players] == [list(player.cursor.pos) for player in simulation.players]
+    assert replay.matches(replayed)